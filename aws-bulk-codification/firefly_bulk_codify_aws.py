@@ -8,10 +8,14 @@ import re
 import shutil
 import subprocess
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any, Dict, Iterable, List, Tuple
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ================= CONFIG =================
 ACCESS_KEY = "ACCESS_KEY"
@@ -32,6 +36,15 @@ SOURCE_FIELDS = []  # fields to include
 EXTRA_PROVIDER_IDS = []  # extra AWS account IDs
 SIZE = 10000  # inventory page size
 
+# Codify throughput
+CONCURRENCY = 8  # parallel /codify requests
+MAX_RPS = 50  # client-side cap on /codify requests per second
+
+# HTTP
+HTTP_POOL_SIZE = 32  # pooled keep-alive connections per host
+HTTP_RETRIES = 3  # retries on 429/5xx, honouring Retry-After
+HTTP_BACKOFF = 0.3  # exponential backoff factor between retries (seconds)
+
 
 # Optional tag filter (client-side)
 TAG_KEY = ""
@@ -51,6 +64,20 @@ INCLUDE_IMPORTS = True
 BASE_URL = "https://api.firefly.ai/api/v1.0"
 SESSION = requests.Session()
 SESSION.headers.update({"Content-Type": "application/json"})
+# One pooled adapter so every call reuses keep-alive connections, and transient
+# throttling/server errors are retried with backoff instead of failing the asset
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=HTTP_POOL_SIZE,
+    pool_maxsize=HTTP_POOL_SIZE,
+    max_retries=Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=["GET", "POST"],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    ),
+))
 
 
 
@@ -279,7 +306,11 @@ def write_outputs(items: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Non
     provider_written = False
     import_cmds_path = out_dir / OUT_IMPORT_CMDS
 
-    with import_cmds_path.open("w", encoding="utf-8") as sh:
+    # Large buffer so the per-command writes are coalesced into few OS writes
+    with import_cmds_path.open("w", encoding="utf-8", buffering=1 << 20) as sh:
+        # Local bindings for the per-asset loop
+        sh_write = sh.write
+        pretty = pretty_hcl
         for req, resp in items:
             asset_type = (req.get("assetType") or "misc").strip()
             buf = per_type.setdefault(asset_type, [])
@@ -288,22 +319,23 @@ def write_outputs(items: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Non
             if INCLUDE_PROVIDER and not provider_written:
                 pb = resp.get("providerBlock")
                 if pb:
-                    (out_dir / "provider.tf").write_text(pretty_hcl(pb), encoding="utf-8")
+                    (out_dir / "provider.tf").write_text(pretty(pb), encoding="utf-8")
                     provider_written = True
 
             # resource HCL
             cr = resp.get("codifiedResult") or ""
             if cr:
-                buf.append(pretty_hcl(cr))
+                buf.append(pretty(cr))
 
             # import blocks + commands
             if INCLUDE_IMPORTS:
                 ib = resp.get("importBlocks") or ""
                 if ib:
-                    buf.append(pretty_hcl(ib))
-                ic = resp.get("importCommand") or ""
+                    buf.append(pretty(ib))
+                ic = resp.get("importCommand")
                 if ic:
-                    sh.write(ic + "\n")
+                    sh_write(ic)
+                    sh_write("\n")
 
     # Write per-type files
     written = 0
@@ -313,10 +345,12 @@ def write_outputs(items: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Non
         tf_path.write_text("".join(chunks), encoding="utf-8")
         written += 1
 
-    # Optional terraform fmt on the whole folder
-    if AUTO_TERRAFORM_FMT and shutil.which("terraform"):
+    # Optional terraform fmt on the whole folder: one process, no shell, using the
+    # resolved path; skipped when no .tf files were written
+    terraform = shutil.which("terraform") if AUTO_TERRAFORM_FMT and written else None
+    if terraform:
         try:
-            subprocess.run(["terraform", "fmt", str(out_dir)], check=False)
+            subprocess.run([terraform, "fmt", str(out_dir)], check=False)
         except Exception:
             pass
 
@@ -324,55 +358,88 @@ def write_outputs(items: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Non
     print(f"Helper import commands: {import_cmds_path}")
 
 
-def codify_assets(assets: List[Dict[str, Any]], sleep_sec: float = 0.02) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+class RateLimiter:
+    """Thread-safe limiter that spaces calls at least 1/rate seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def codify_assets(assets: List[Dict[str, Any]], max_workers: int = CONCURRENCY,
+                  max_rps: float = MAX_RPS) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
     """
-    Codify all assets with detailed progress logging (per-item line + periodic ETA).
-    Returns list of (request, response) tuples for successes.
+    Codify all assets in parallel with detailed progress logging (per-item line + periodic ETA).
+    Requests are spread over max_workers threads and capped at max_rps.
+    Returns list of (request, response) tuples for successes, in input order.
     """
     total = len(assets)
     ok = 0
     fail = 0
-    out: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    results: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+    limiter = RateLimiter(max_rps)
     t0 = time.time()
 
-    for idx, req in enumerate(assets, start=1):
-        at = req.get("assetType", "?")
-        aid = (req.get("assetId") or "")[:150]
-        print(f"    [{idx}/{total}] {at} → {aid}", flush=True)
-
-        missing = [k for k in ("assetType", "assetId", "iacType", "provider", "accountNumber") if not req.get(k)]
-        if missing:
-            print(f"      ⨯ skip (missing {missing})", flush=True)
-            fail += 1
-            continue
-
-        try:
-            t_call = time.time()
-            resp = codify_one(req)
-            dt = time.time() - t_call
-            out.append((req, resp))
-            ok += 1
-            print(f"      ✓ ok ({dt:.2f}s)", flush=True)
-        except APIError as e:
-            fail += 1
-            msg = str(e)
-            if len(msg) > 300:
-                msg = msg[:300] + "…"
-            print(f"      ⨯ failed: {msg}", flush=True)
-
-        if sleep_sec > 0:
-            time.sleep(sleep_sec)
-
-        if idx % 25 == 0 or idx == total:
-            elapsed = time.time() - t0
-            rate = idx / elapsed if elapsed > 0 else 0.0
-            remaining = total - idx
-            eta = remaining / rate if rate > 0 else 0.0
-            print(f"    — progress: {idx}/{total} | ok={ok} fail={fail} | {rate:.1f}/s | ETA ~{eta:.0f}s", flush=True)
+    def _codify_one(req: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        limiter.wait()
+        t_call = time.time()
+        resp = codify_one(req)
+        return resp, time.time() - t_call
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for idx, req in enumerate(assets, start=1):
+            missing = [k for k in ("assetType", "assetId", "iacType", "provider", "accountNumber") if not req.get(k)]
+            if missing:
+                print(f"    [{idx}/{total}] {req.get('assetType', '?')} → {(req.get('assetId') or '')[:150]}", flush=True)
+                print(f"      ⨯ skip (missing {missing})", flush=True)
+                fail += 1
+                continue
+            futures[executor.submit(_codify_one, req)] = idx
+
+        # Log and count in this thread as requests finish
+        done = fail
+        for fut in as_completed(futures):
+            idx = futures[fut]
+            req = assets[idx - 1]
+            done += 1
+            at = req.get("assetType", "?")
+            aid = (req.get("assetId") or "")[:150]
+            print(f"    [{done}/{total}] {at} → {aid}", flush=True)
+
+            try:
+                resp, dt = fut.result()
+                results[idx] = (req, resp)
+                ok += 1
+                print(f"      ✓ ok ({dt:.2f}s)", flush=True)
+            except APIError as e:
+                fail += 1
+                msg = str(e)
+                if len(msg) > 300:
+                    msg = msg[:300] + "…"
+                print(f"      ⨯ failed: {msg}", flush=True)
+
+            if done % 25 == 0 or done == total:
+                elapsed = time.time() - t0
+                rate = done / elapsed if elapsed > 0 else 0.0
+                remaining = total - done
+                eta = remaining / rate if rate > 0 else 0.0
+                print(f"    — progress: {done}/{total} | ok={ok} fail={fail} | {rate:.1f}/s | ETA ~{eta:.0f}s", flush=True)
 
     elapsed = time.time() - t0
     print(f"    Done codifying: ok={ok}, fail={fail}, total={total}, elapsed={elapsed:.1f}s", flush=True)
-    return out
+    return [results[idx] for idx in sorted(results)]
 
 
 def main() -> None:
@@ -397,7 +464,7 @@ def main() -> None:
         return
 
     print("[5/6] Codifying assets…", file=sys.stderr)
-    codified_pairs = codify_assets(assets, sleep_sec=0.02)
+    codified_pairs = codify_assets(assets)
 
     print("[6/6] Writing outputs…", file=sys.stderr)
     write_outputs(codified_pairs)
@@ -7,21 +7,30 @@ This provides a lightweight way to get EBS and RDS snapshot pricing per region.
 import json
 import logging
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Average days per month, used to convert snapshot age into billed months
+DAYS_PER_MONTH = 30.44
+
 class AWSPricingFetcher:
     def __init__(self, cache_dir: str = "./aws"):
         self.cache_dir = Path(cache_dir)
         self.pricing_file = self.cache_dir / "snapshot-prices.json"
         self.pricing_data = None
+        self.price_index: Dict[Tuple[str, str], float] = {}
         
     def ensure_pricing_loaded(self):
         """Ensure pricing data is loaded from the JSON file."""
         if self.pricing_data is None:
             self._load_pricing_data()
     
+    def preload(self) -> Dict[Tuple[str, str], float]:
+        """Load pricing data up front and return the flat (region, price key) -> price index."""
+        self.ensure_pricing_loaded()
+        return self.price_index
+    
     def _load_pricing_data(self):
         """Load pricing data from the local JSON file."""
         if not self.pricing_file.exists():
@@ -37,6 +46,14 @@ class AWSPricingFetcher:
         except Exception as e:
             logger.error(f"Error loading pricing data: {e}")
             self.pricing_data = {}
+            return
+        
+        # Flatten the per-region tables so per-snapshot lookups are a single dict probe
+        self.price_index = {
+            (region, price_key): price
+            for region, region_data in self.pricing_data.get('regions', {}).items()
+            for price_key, price in region_data.items()
+        }
     
     def get_ebs_price(self, region: str, storage_tier: Optional[str] = None) -> Optional[float]:
         """Get EBS snapshot price for a region.
@@ -51,21 +68,18 @@ class AWSPricingFetcher:
         """
         self.ensure_pricing_loaded()
         
-        region_data = self.pricing_data.get('regions', {}).get(region, {})
-        
         # For archive tier, use archive pricing
         if storage_tier == 'archive':
-            return region_data.get('ebs_snapshot_archive_gb_month')
+            return self.price_index.get((region, 'ebs_snapshot_archive_gb_month'))
         
         # For standard tier or None, use standard pricing
-        return region_data.get('ebs_snapshot_gb_month')
+        return self.price_index.get((region, 'ebs_snapshot_gb_month'))
     
     def get_rds_price(self, region: str) -> Optional[float]:
         """Get RDS snapshot price for a region."""
         self.ensure_pricing_loaded()
         
-        region_data = self.pricing_data.get('regions', {}).get(region, {})
-        return region_data.get('rds_snapshot_gb_month')
+        return self.price_index.get((region, 'rds_snapshot_gb_month'))
     
     def calculate_monthly_cost(self, size_gb: float, region: str, snapshot_type: str, 
                               storage_tier: Optional[str] = None) -> Optional[float]:
@@ -113,7 +127,7 @@ class AWSPricingFetcher:
             return None
         
         # Convert days to months (approximate)
-        months = age_days / 30.44  # Average days per month
+        months = age_days / DAYS_PER_MONTH
         return monthly_cost * months
     
     def print_pricing_table(self):
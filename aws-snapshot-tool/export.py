@@ -4,12 +4,32 @@ CSV Export - Streaming CSV writer with the exact header format.
 
 import csv
 import logging
+from itertools import islice, repeat
 from typing import Dict, Any, Iterator, TextIO, List
 from io import StringIO
 from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
+# Write buffer for CSV output, so large exports hit the disk in big chunks
+WRITE_BUFFER_SIZE = 1 << 20
+
+# Rows handed to the csv writer per writerows() call
+EXPORT_BATCH_SIZE = 1024
+
+
+def _row_getter(fieldnames: List[str]):
+    """
+    Build a function returning a row dict's values in header order ('' for missing fields).
+    Specialized once per header so rows don't go through DictWriter's per-row field handling.
+    """
+    fields = tuple(fieldnames)
+    
+    def row_values(data: Dict[str, Any]) -> Iterator[Any]:
+        return map(data.get, fields, repeat(''))
+    
+    return row_values
+
 
 class CSVExporter:
     """
@@ -41,18 +61,25 @@ class CSVExporter:
         self.include_costs = include_costs
         # Build header dynamically based on costs flag
         self.CSV_HEADER = self.BASE_HEADER + (self.COST_COLUMNS if include_costs else [])
+        self._row_values = _row_getter(self.CSV_HEADER)
+        self._writer = None
+        self._writer_handle = None
+    
+    def _get_writer(self, file_handle: TextIO):
+        """Return a csv writer bound to file_handle, reusing it across rows"""
+        if self._writer_handle is not file_handle:
+            self._writer = csv.writer(file_handle)
+            self._writer_handle = file_handle
+        return self._writer
     
     def write_header(self, file_handle: TextIO):
         """Write CSV header to file"""
-        writer = csv.writer(file_handle)
-        writer.writerow(self.CSV_HEADER)
+        self._get_writer(file_handle).writerow(self.CSV_HEADER)
         logger.info("CSV header written")
     
     def write_row(self, file_handle: TextIO, data: Dict[str, Any]):
         """Write a single row to CSV"""
-        writer = csv.writer(file_handle)
-        row = [data.get(field, '') for field in self.CSV_HEADER]
-        writer.writerow(row)
+        self._get_writer(file_handle).writerow(self._row_values(data))
     
     def export_snapshots(self, snapshots):
         """
@@ -69,21 +96,25 @@ class CSVExporter:
             snapshots_iter = snapshots
             total = None
         
-        with open(self.output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        with open(self.output_file, 'w', newline='', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as csvfile:
             # Write header
             self.write_header(csvfile)
             
-            # Stream rows with progress bar
+            # Stream rows in batches with progress bar
+            writerows = self._get_writer(csvfile).writerows
+            rows = map(self._row_values, snapshots_iter)
             row_count = 0
             with tqdm(total=total, desc="Exporting CSV", unit="row", disable=total is None) as pbar:
-                for snapshot in snapshots_iter:
-                    self.write_row(csvfile, snapshot)
-                    row_count += 1
+                while True:
+                    batch = list(islice(rows, EXPORT_BATCH_SIZE))
+                    if not batch:
+                        break
+                    writerows(batch)
+                    row_count += len(batch)
                     
-                    if pbar:
-                        pbar.update(1)
-                        pbar.set_postfix({'rows': row_count})
-                    elif row_count % 100 == 0:
+                    if total is not None:
+                        pbar.update(len(batch))
+                    else:
                         logger.info(f"Exported {row_count} snapshots...")
             
             logger.info(f"CSV export completed. Total rows: {row_count}")
@@ -99,8 +130,6 @@ class CSVExporter:
         writer.writerow(self.CSV_HEADER)
         
         # Write rows
-        for snapshot in snapshots:
-            row = [snapshot.get(field, '') for field in self.CSV_HEADER]
-            writer.writerow(row)
+        writer.writerows(map(self._row_values, snapshots))
         
         return output.getvalue()
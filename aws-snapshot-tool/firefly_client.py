@@ -9,9 +9,36 @@ from typing import Dict, List, Optional, Any, Iterator
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from urllib.parse import urljoin
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
+def parse_json(response: requests.Response) -> Any:
+    """Decode a JSON response body, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def asset_region(asset: Dict[str, Any]) -> Optional[str]:
+    """
+    Region of an inventory asset from its region/availabilityZone field or ARN, or None.
+    """
+    region = asset.get('region') or asset.get('availabilityZone')
+    if region:
+        # "us-east-1a" -> "us-east-1" (region codes end in a digit)
+        return region[:-1] if region[-1:].isalpha() else region
+    # ARN format: arn:aws:service:region:account:...
+    parts = (asset.get('arn') or '').split(':', 4)
+    if len(parts) > 4 and parts[3]:
+        return parts[3]
+    return None
+
+
 class FireflyAPIError(Exception):
     """Custom exception for Firefly API errors"""
     pass
@@ -52,7 +79,7 @@ class FireflyClient:
             )
             response.raise_for_status()
             
-            auth_data = response.json()
+            auth_data = parse_json(response)
             self.access_token = auth_data.get('accessToken')
             
             if not self.access_token:
@@ -145,7 +172,7 @@ class FireflyClient:
                 payload["afterKey"] = after_key
             
             response = self._request_with_retry('POST', endpoint, json=payload)
-            data = response.json()
+            data = parse_json(response)
             
             # Extract snapshots from response
             snapshots = data.get('responseObjects', [])
@@ -203,7 +230,7 @@ class FireflyClient:
                 payload["afterKey"] = after_key
             
             response = self._request_with_retry('POST', endpoint, json=payload)
-            data = response.json()
+            data = parse_json(response)
             
             # Extract snapshots from response
             snapshots = data.get('responseObjects', [])
@@ -252,7 +279,7 @@ class FireflyClient:
             
             try:
                 response = self._request_with_retry('POST', endpoint, json=payload)
-                data = response.json()
+                data = parse_json(response)
                 
                 instances = data.get('responseObjects', [])
                 for instance in instances:
@@ -291,7 +318,7 @@ class FireflyClient:
         
         try:
             response = self._request_with_retry('POST', endpoint, json=payload)
-            data = response.json()
+            data = parse_json(response)
             
             # Return the first matching instance
             instances = data.get('responseObjects', [])
@@ -326,7 +353,7 @@ class FireflyClient:
         
         try:
             response = self._request_with_retry('POST', endpoint, json=payload)
-            data = response.json()
+            data = parse_json(response)
             
             # Return the first matching instance
             instances = data.get('responseObjects', [])
@@ -371,7 +398,7 @@ class FireflyClient:
             
             try:
                 response = self._request_with_retry('POST', endpoint, json=payload)
-                data = response.json()
+                data = parse_json(response)
                 
                 volumes = data.get('responseObjects', [])
                 for volume in volumes:
@@ -414,7 +441,7 @@ class FireflyClient:
         
         try:
             response = self._request_with_retry('POST', endpoint, json=payload)
-            data = response.json()
+            data = parse_json(response)
             
             volumes = data.get('responseObjects', [])
             volume_map = {vol.get('resourceId'): vol for vol in volumes}
@@ -446,7 +473,7 @@ class FireflyClient:
         
         try:
             response = self._request_with_retry('POST', endpoint, json=payload)
-            data = response.json()
+            data = parse_json(response)
             
             instances = data.get('responseObjects', [])
             if instances:
@@ -459,6 +486,41 @@ class FireflyClient:
             logger.error(f"Error fetching instance {instance_id}: {e}")
             return None
     
+    def get_ec2_instances_by_ids(self, instance_ids: List[str], account_id: Optional[str] = None,
+                                 region: Optional[str] = None, batch_size: int = 200) -> Dict[str, Dict[str, Any]]:
+        """
+        Batch fetch EC2 instances by ID, batch_size IDs per API call.
+        Returns a dict mapping instance ID to instance; IDs that aren't found are omitted.
+        """
+        endpoint = "/api/v1.0/inventory"
+        instance_map = {}
+        
+        for start in range(0, len(instance_ids), batch_size):
+            chunk = instance_ids[start:start + batch_size]
+            payload = {
+                "assetTypes": ["aws_ec2_instance"],
+                "size": len(chunk),
+                "filters": {
+                    "resourceId": {"$in": chunk}
+                }
+            }
+            
+            if account_id:
+                payload["providerIds"] = [account_id]
+            
+            try:
+                response = self._request_with_retry('POST', endpoint, json=payload)
+                data = parse_json(response)
+                
+                for instance in data.get('responseObjects', []):
+                    instance_map.setdefault(instance.get('resourceId'), instance)
+                
+            except Exception as e:
+                logger.error(f"Error batch fetching {len(chunk)} instances: {e}")
+        
+        logger.debug(f"Batch fetched {len(instance_map)} instances out of {len(instance_ids)} requested")
+        return instance_map
+    
     def get_ec2_instances_batch(self, account_id: Optional[str] = None,
                                 region: Optional[str] = None) -> List[Dict[str, Any]]:
         """
@@ -477,7 +539,7 @@ class FireflyClient:
         
         try:
             response = self._request_with_retry('POST', endpoint, json=payload)
-            data = response.json()
+            data = parse_json(response)
             
             instances = data.get('responseObjects', [])
             
@@ -487,6 +549,53 @@ class FireflyClient:
             logger.error(f"Error batch fetching EC2 instances: {e}")
             return []
 
+    def get_db_instances_batch(self, account_id: Optional[str] = None,
+                               region: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch all DB instances, paging through the inventory.
+        This eliminates per-snapshot get_db_instance lookups.
+        The API has no region filter, so instances known to be in another region are dropped here;
+        on an API error the instances fetched so far are returned.
+        """
+        endpoint = "/api/v1.0/inventory"
+        
+        payload = {
+            "assetTypes": ["aws_db_instance"],
+            "size": 10000
+        }
+        
+        if account_id:
+            payload["providerIds"] = [account_id]
+        
+        db_instances = []
+        after_key = None
+        while True:
+            if after_key:
+                payload["afterKey"] = after_key
+            
+            try:
+                response = self._request_with_retry('POST', endpoint, json=payload)
+                data = parse_json(response)
+            except Exception as e:
+                logger.error(f"Error batch fetching DB instances: {e}")
+                break
+            
+            page = data.get('responseObjects') or []
+            for instance in page:
+                instance_region = asset_region(instance) if region else None
+                if instance_region is None or instance_region == region:
+                    db_instances.append(instance)
+            
+            # Check if we need to continue pagination
+            if len(page) < payload['size']:
+                break
+            
+            after_key = data.get('afterKey')
+            if not after_key:
+                break
+        
+        return db_instances
+
     def get_volume_details(self, volume_id: str, account_id: Optional[str] = None,
                            region: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
@@ -508,7 +617,7 @@ class FireflyClient:
         
         try:
             response = self._request_with_retry('POST', endpoint, json=payload)
-            data = response.json()
+            data = parse_json(response)
             
             # Return the first matching volume
             volumes = data.get('responseObjects', [])
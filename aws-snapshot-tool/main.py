@@ -10,16 +10,38 @@ import logging
 from pathlib import Path
 from typing import List, Optional
 import click
-from tqdm import tqdm
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
+from itertools import chain
 
 from firefly_client import FireflyClient
 from resolver import ParentResolver
 from normalize import DataNormalizer
 from export import CSVExporter
 
+if sys.stderr.isatty():
+    from tqdm import tqdm
+else:
+    class _NoopBar:
+        """Stand-in progress bar used when nobody is watching stderr"""
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc_info):
+            return False
+        
+        def update(self, n=1):
+            pass
+        
+        def set_postfix(self, *args, **kwargs):
+            pass
+    
+    def tqdm(iterable=None, **kwargs):
+        """Skip progress rendering entirely in non-interactive runs (pipes, CI)"""
+        return iterable if iterable is not None else _NoopBar()
+
 
 def setup_logging(verbose: bool):
     """Setup logging configuration"""
@@ -62,7 +84,7 @@ def collect_snapshots_parallel(client: FireflyClient, account_ids: List[str], re
     """
     Collect EBS and DB snapshots in parallel for better performance.
     """
-    all_snapshots = []
+    task_results = []
     logger = logging.getLogger(__name__)
     
     def collect_ebs_snapshots(account_id, region):
@@ -72,7 +94,7 @@ def collect_snapshots_parallel(client: FireflyClient, account_ids: List[str], re
             for snapshot in client.list_ebs_snapshots(account_id, region, since):
                 snapshots.append(('ebs', snapshot, account_id, region))
         except Exception as e:
-            logger.error(f"Error collecting EBS snapshots for account {account_id}, region {region}: {e}")
+            logger.error("Error collecting EBS snapshots for account %s, region %s: %s", account_id, region, e)
         return snapshots
     
     def collect_db_snapshots(account_id, region):
@@ -82,7 +104,7 @@ def collect_snapshots_parallel(client: FireflyClient, account_ids: List[str], re
             for snapshot in client.list_db_snapshots(account_id, region, since):
                 snapshots.append(('db', snapshot, account_id, region))
         except Exception as e:
-            logger.error(f"Error collecting DB snapshots for account {account_id}, region {region}: {e}")
+            logger.error("Error collecting DB snapshots for account %s, region %s: %s", account_id, region, e)
         return snapshots
     
     # Create tasks for parallel execution
@@ -106,7 +128,7 @@ def collect_snapshots_parallel(client: FireflyClient, account_ids: List[str], re
                 task_name, account_id, region = future_to_task[future]
                 try:
                     snapshots = future.result()
-                    all_snapshots.extend(snapshots)
+                    task_results.append(snapshots)
                     pbar.set_postfix({
                         'account': account_id or 'all',
                         'region': region or 'all',
@@ -114,11 +136,12 @@ def collect_snapshots_parallel(client: FireflyClient, account_ids: List[str], re
                         'count': len(snapshots)
                     })
                 except Exception as e:
-                    logger.error(f"Task {task_name} failed for account {account_id}, region {region}: {e}")
+                    logger.error("Task %s failed for account %s, region %s: %s", task_name, account_id, region, e)
                 finally:
                     pbar.update(1)
     
-    return all_snapshots
+    # Flatten once at the end instead of growing a single list per task
+    return list(chain.from_iterable(task_results))
 
 
 def process_snapshots(client: FireflyClient, resolver: ParentResolver, normalizer: DataNormalizer,
@@ -131,81 +154,88 @@ def process_snapshots(client: FireflyClient, resolver: ParentResolver, normalize
     # Collect all snapshots with progress bar
     logger.info("Starting snapshot collection...")
     all_snapshots = collect_snapshots_parallel(client, account_ids, regions, since)
-    logger.info(f"Collected {len(all_snapshots)} total snapshots for processing")
+    logger.info("Collected %d total snapshots for processing", len(all_snapshots))
     
     if not all_snapshots:
         logger.warning("No snapshots found to process")
         return
     
-    # Group snapshots by type for batch processing
-    ebs_snapshots = [(s, a, r) for t, s, a, r in all_snapshots if t == 'ebs']
-    db_snapshots = [(s, a, r) for t, s, a, r in all_snapshots if t == 'db']
+    # Group snapshots by account/region and type so every parent is resolved
+    # from one inventory pre-fetch per account/region
+    by_account_region = {}
+    for snapshot_type, snapshot, account_id, region in all_snapshots:
+        by_type = by_account_region.setdefault((account_id, region), {'ebs': [], 'db': []})
+        by_type[snapshot_type].append(snapshot)
     
-    # Batch resolve EBS parents with progress bar
-    ebs_parents = {}
-    if ebs_snapshots:
-        logger.info(f"Batch resolving parents for {len(ebs_snapshots)} EBS snapshots...")
-        # Group by account/region for batch processing
-        ebs_by_account_region = {}
-        for snapshot, account_id, region in ebs_snapshots:
-            key = (account_id, region)
-            if key not in ebs_by_account_region:
-                ebs_by_account_region[key] = []
-            ebs_by_account_region[key].append(snapshot)
+    # Batch resolve EBS and DB parents with progress bar
+    parents = {}
+    logger.info("Batch resolving parents for %d snapshots...", len(all_snapshots))
+    with tqdm(total=len(by_account_region), desc="Resolving parents", unit="batch") as pbar:
+        for (account_id, region), snapshots_by_type in by_account_region.items():
+            try:
+                parents.update(resolver.resolve_parents_all(snapshots_by_type, account_id, region))
+                pbar.set_postfix({
+                    'account': account_id or 'all',
+                    'region': region or 'all',
+                    'snapshots': len(snapshots_by_type['ebs']) + len(snapshots_by_type['db'])
+                })
+            except Exception as e:
+                logger.error("Error batch resolving parents for account %s, region %s: %s", account_id, region, e)
+            finally:
+                pbar.update(1)
+    
+    # Bind hot-loop methods once rather than per snapshot
+    get_parent = parents.get
+    normalize = normalizer.normalize_snapshot_data
+    
+    def process_snapshot(item):
+        """Look up the resolved parent, apply filters and normalize a single snapshot"""
+        snapshot_type, snapshot, _, _ = item
+        try:
+            resolved = get_parent(snapshot.get('resourceId'))
+            if resolved is None:
+                # Resolution failed; reporting it as orphaned would be a guess
+                logger.error("Skipping %s snapshot %s: parent could not be resolved",
+                             snapshot_type, snapshot.get('resourceId', 'unknown'))
+                return None
+            parent, orphaned = resolved
+            
+            # Apply filters if specified
+            if orphaned_only and not orphaned:
+                return None  # Skip non-orphaned snapshots
+            if parent_only and orphaned:
+                return None  # Skip orphaned snapshots
+            
+            # Normalize data
+            normalized = normalize(snapshot, snapshot_type, parent, orphaned)
+            return normalized, snapshot_type, orphaned
         
-        # Batch resolve for each account/region combination with progress bar
-        with tqdm(total=len(ebs_by_account_region), desc="Resolving EBS parents", unit="batch") as pbar:
-            for (account_id, region), snapshots in ebs_by_account_region.items():
-                try:
-                    batch_results = resolver.resolve_ebs_parents_batch(snapshots, account_id, region)
-                    ebs_parents.update(batch_results)
-                    pbar.set_postfix({
-                        'account': account_id or 'all',
-                        'region': region or 'all',
-                        'snapshots': len(snapshots)
-                    })
-                except Exception as e:
-                    logger.error(f"Error batch resolving EBS parents for account {account_id}, region {region}: {e}")
-                finally:
-                    pbar.update(1)
+        except Exception as e:
+            logger.error("Error processing %s snapshot %s: %s", snapshot_type, snapshot.get('resourceId', 'unknown'), e)
+            return None
     
-    # Process and yield snapshots with progress bar
+    # Parents are already resolved, so the remaining work is CPU-bound;
+    # process snapshots in input order with progress bar, aging every row
+    # against the same clock reading
     processed_count = 0
-    with tqdm(total=len(all_snapshots), desc="Processing snapshots", unit="snapshot") as pbar:
-        for snapshot_type, snapshot, account_id, region in all_snapshots:
-            try:
-                # Resolve parent based on type
-                if snapshot_type == 'ebs':
-                    parent, orphaned = ebs_parents.get(snapshot.get('resourceId'), (None, True))
-                else:  # db
-                    parent, orphaned = resolver.resolve_db_parent(snapshot, account_id, region)
-                
-                # Apply filters if specified
-                if orphaned_only and not orphaned:
-                    pbar.update(1)
-                    continue  # Skip non-orphaned snapshots
-                if parent_only and orphaned:
-                    pbar.update(1)
-                    continue  # Skip orphaned snapshots
-                
-                # Normalize data
-                normalized = normalizer.normalize_snapshot_data(
-                    snapshot, snapshot_type, parent, orphaned
-                )
-                
-                processed_count += 1
+    with normalizer.batch_clock(), tqdm(total=len(all_snapshots), desc="Processing snapshots", unit="snapshot",
+                                        miniters=1000, mininterval=0.5) as pbar:
+        for result in map(process_snapshot, all_snapshots):
+            pbar.update(1)
+            if result is None:
+                continue
+            
+            normalized, snapshot_type, orphaned = result
+            processed_count += 1
+            # Refresh the postfix only every 1024 rows to keep it out of the hot path
+            if processed_count & 0x3FF == 0:
                 pbar.set_postfix({
                     'processed': processed_count,
                     'type': snapshot_type.upper(),
                     'orphaned': 'yes' if orphaned else 'no'
                 })
-                
-                yield normalized
-                
-            except Exception as e:
-                logger.error(f"Error processing {snapshot_type} snapshot {snapshot.get('resourceId', 'unknown')}: {e}")
-            finally:
-                pbar.update(1)
+            
+            yield normalized
 
 
 @click.command()
@@ -218,6 +248,8 @@ def process_snapshots(client: FireflyClient, resolver: ParentResolver, normalize
               help='Firefly API secret key (or set FIREFLY_SECRET_KEY env var)')
 @click.option('--account-id', multiple=True, 
               help='Account ID filter (can be specified multiple times)')
+@click.option('--since',
+              help='Only include snapshots created after this ISO date (e.g. 2024-01-01), filtered server-side')
 @click.option('--out', 
               help='Output file path (default: reports/snapshot-report-{YYYYMMDD-HHMMSS}.csv)')
 @click.option('--orphaned-only', is_flag=True,
@@ -232,7 +264,7 @@ def process_snapshots(client: FireflyClient, resolver: ParentResolver, normalize
               help='Output format: csv, html, or both (default: csv)')
 def main(firefly_base_url: str, firefly_access_key: Optional[str],
          firefly_secret_key: Optional[str], account_id: List[str],
-         out: str, orphaned_only: bool, parent_only: bool, verbose: bool, output_format: str):
+         since: Optional[str], out: str, orphaned_only: bool, parent_only: bool, verbose: bool, output_format: str):
     """
     Volume Snapshot Tool - Correlate EBS and RDS/DB snapshots to parent resources.
     
@@ -243,22 +275,27 @@ def main(firefly_base_url: str, firefly_access_key: Optional[str],
     setup_logging(verbose)
     logger = logging.getLogger(__name__)
     
+    # Fail fast on bad input before any expensive setup
+    if orphaned_only and parent_only:
+        raise click.ClickException("Cannot use both --orphaned-only and --parent-only at the same time")
+    
+    # Get Firefly API credentials
+    access_key, secret_key = get_credentials(firefly_access_key, firefly_secret_key)
+    
     # Set default output path if not provided
     if not out:
         from datetime import datetime
         now = datetime.now().strftime('%Y%m%d-%H%M%S')
         out = f"reports/snapshot-report-{now}.csv"
-        logger.info(f"No output path specified, using default: {out}")
+        logger.info("No output path specified, using default: %s", out)
     
     logger.info("Starting Volume Snapshot Tool")
-    logger.info(f"Firefly API URL: {firefly_base_url}")
-    logger.info(f"Output file: {out}")
+    logger.info("Firefly API URL: %s", firefly_base_url)
+    logger.info("Output file: %s", out)
     if account_id:
-        logger.info(f"Account IDs: {', '.join(account_id)}")
-    
-    # Validate filter options
-    if orphaned_only and parent_only:
-        raise click.ClickException("Cannot use both --orphaned-only and --parent-only at the same time")
+        logger.info("Account IDs: %s", ', '.join(account_id))
+    if since:
+        logger.info("Since: %s", since)
     
     if orphaned_only:
         logger.info("Filtering: Orphaned snapshots only")
@@ -268,9 +305,6 @@ def main(firefly_base_url: str, firefly_access_key: Optional[str],
         logger.info("Filtering: All snapshots")
     
     try:
-        # Get Firefly API credentials
-        access_key, secret_key = get_credentials(firefly_access_key, firefly_secret_key)
-        
         # Initialize components
         client = FireflyClient(firefly_base_url, access_key, secret_key)
         resolver = ParentResolver(client)
@@ -278,6 +312,7 @@ def main(firefly_base_url: str, firefly_access_key: Optional[str],
         # Initialize pricing fetcher for cost calculations
         from aws_pricing import AWSPricingFetcher
         pricing_fetcher = AWSPricingFetcher()
+        pricing_fetcher.preload()
         logger.info("Cost calculations enabled - using snapshot-prices.json")
         
         normalizer = DataNormalizer(pricing_fetcher=pricing_fetcher)
@@ -288,7 +323,7 @@ def main(firefly_base_url: str, firefly_access_key: Optional[str],
         
         if output_format in ['csv', 'both']:
             csv_exporter = CSVExporter(out)
-            logger.info(f"CSV export enabled: {out}")
+            logger.info("CSV export enabled: %s", out)
         
         if output_format in ['html', 'both']:
             from html_report import HTMLReportGenerator
@@ -296,17 +331,17 @@ def main(firefly_base_url: str, firefly_access_key: Optional[str],
             output_dir = Path(out).parent
             output_dir.mkdir(parents=True, exist_ok=True)
             html_generator = HTMLReportGenerator(output_dir)
-            logger.info(f"HTML report generation enabled")
+            logger.info("HTML report generation enabled")
         
         # Process snapshots with timing
         import time
         start_time = time.time()
         
         logger.info("Starting snapshot processing...")
-        snapshots = process_snapshots(client, resolver, normalizer, account_id, None, None, orphaned_only, parent_only)
+        snapshots = process_snapshots(client, resolver, normalizer, account_id, None, since, orphaned_only, parent_only)
         
         processing_time = time.time() - start_time
-        logger.info(f"Snapshot processing completed in {processing_time:.2f} seconds")
+        logger.info("Snapshot processing completed in %.2f seconds", processing_time)
         
         # Export based on format with progress bars
         if csv_exporter and html_generator:
@@ -319,7 +354,7 @@ def main(firefly_base_url: str, firefly_access_key: Optional[str],
             logger.info("Starting CSV export...")
             csv_exporter.export_snapshots(snapshots_list)
             csv_time = time.time() - csv_start
-            logger.info(f"CSV export completed in {csv_time:.2f} seconds")
+            logger.info("CSV export completed in %.2f seconds", csv_time)
             
             # HTML export
             html_start = time.time()
@@ -327,7 +362,7 @@ def main(firefly_base_url: str, firefly_access_key: Optional[str],
             html_filename = Path(out).stem + ".html"
             html_generator.generate_report(snapshots_list, html_filename)
             html_time = time.time() - html_start
-            logger.info(f"HTML report generation completed in {html_time:.2f} seconds")
+            logger.info("HTML report generation completed in %.2f seconds", html_time)
             
         elif csv_exporter:
             # CSV only
@@ -335,7 +370,7 @@ def main(firefly_base_url: str, firefly_access_key: Optional[str],
             logger.info("Starting CSV export...")
             csv_exporter.export_snapshots(snapshots)
             csv_time = time.time() - csv_start
-            logger.info(f"CSV export completed in {csv_time:.2f} seconds")
+            logger.info("CSV export completed in %.2f seconds", csv_time)
             
         elif html_generator:
             # HTML only
@@ -346,13 +381,13 @@ def main(firefly_base_url: str, firefly_access_key: Optional[str],
             html_filename = Path(out).stem + ".html"
             html_generator.generate_report(snapshots_list, html_filename)
             html_time = time.time() - html_start
-            logger.info(f"HTML report generation completed in {html_time:.2f} seconds")
+            logger.info("HTML report generation completed in %.2f seconds", html_time)
         
         total_time = time.time() - start_time
-        logger.info(f"Volume Snapshot Tool completed successfully in {total_time:.2f} seconds")
+        logger.info("Volume Snapshot Tool completed successfully in %.2f seconds", total_time)
         
     except Exception as e:
-        logger.error(f"Tool failed: {e}")
+        logger.error("Tool failed: %s", e)
         sys.exit(1)
 
 
@@ -3,21 +3,79 @@ Data Normalization - Tag extraction, name selection, state mapping, date parsing
 """
 
 import logging
+import time
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional, List, Union
+from functools import lru_cache
+from typing import Dict, Any, Iterator, Optional, List, Tuple, Union
 from dateutil import parser
 
+from aws_pricing import DAYS_PER_MONTH
+
+try:
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
 logger = logging.getLogger(__name__)
 
+_SNAPSHOT_ID_KEYS = ('assetId', 'resourceId', 'id')
+_ID_KEYS = ('resourceId', 'assetId', 'id')
+
+# Bytes -> GB as a multiplication; exact since 1 << 30 is a power of two
+_INV_BYTES_PER_GB = 1.0 / (1 << 30)
+
+_SECONDS_PER_DAY = 86400
+
+# Availability zone suffix letters (region codes themselves end in a digit)
+_AZ_SUFFIXES = frozenset('abcdefg')
+
+
+def _first_nonempty(data: Dict[str, Any], keys: Tuple[str, ...], default: Any = '') -> Any:
+    """Return the first truthy value among keys, or default."""
+    for key in keys:
+        value = data.get(key)
+        if value:
+            return value
+    return default
+
 
 class DataNormalizer:
     """
     Normalizes data from Firefly API responses to standardized CSV format.
     """
     
+    # State fields to check, in priority order, per parent resource type
+    _STATE_KEYS = {
+        'ec2_instance': ('state', 'instance_state', 'resource_status'),
+        'db_instance': ('state', 'db_instance_status', 'resource_status'),
+    }
+    _DEFAULT_STATE_KEYS = ('state', 'resource_status')
+    
+    __slots__ = (
+        'environment_tag_keys',
+        '_env_keys_lower',
+        'pricing_fetcher',
+        '_pricing_ready',
+        '_batch_now',
+        '_batch_now_epoch',
+        '_price_cache',
+        '_size_handlers',
+    )
+    
     def __init__(self, pricing_fetcher):
         self.environment_tag_keys = ['environment', 'env', 'Environment']
+        # Lowercased priority keys (duplicates dropped) for case-insensitive probes
+        self._env_keys_lower = tuple(dict.fromkeys(k.lower() for k in self.environment_tag_keys))
         self.pricing_fetcher = pricing_fetcher
+        self._pricing_ready = False
+        # Shared reference time for age calculations; None reads the clock per row
+        self._batch_now: Optional[datetime] = None
+        self._batch_now_epoch: Optional[float] = None
+        # (region, snapshot_type, storage_tier) -> price per GB-month (None when not provided)
+        self._price_cache: Dict[Tuple[str, str, Optional[str]], Optional[float]] = {}
+        # Per snapshot type size selection: snapshot_type -> handler(snapshot, snapshot_id)
+        self._size_handlers = {'ebs': self._ebs_size, 'db': self._db_size}
     
     def extract_environment(self, tags: Union[Dict[str, Any], List[Dict[str, Any]]]) -> Optional[str]:
         """
@@ -26,22 +84,26 @@ class DataNormalizer:
         if not tags:
             return None
         
-        # Check priority order - first match wins
-        for key in self.environment_tag_keys:
-            # Handle dict tags (as in your data: {"Name": "attached-ebs"})
-            if isinstance(tags, dict):
-                if key.lower() in [k.lower() for k in tags.keys()]:
-                    # Find the actual key (case-insensitive)
-                    actual_key = next(k for k in tags.keys() if k.lower() == key.lower())
-                    return tags[actual_key]
-            
-            # Handle list tags (fallback for other formats)
-            elif isinstance(tags, list):
-                for tag in tags:
-                    tag_key = tag.get('key')
-                    tag_value = tag.get('value')
-                    if tag_key and tag_value and tag_key.lower() == key.lower():
-                        return tag_value
+        # Index tag values by lowercased key once (first occurrence wins),
+        # then probe in priority order - first match wins
+        values_by_key = {}
+        
+        # Handle dict tags (as in your data: {"Name": "attached-ebs"})
+        if isinstance(tags, dict):
+            for tag_key, tag_value in tags.items():
+                values_by_key.setdefault(tag_key.lower(), tag_value)
+        
+        # Handle list tags (fallback for other formats)
+        elif isinstance(tags, list):
+            for tag in tags:
+                tag_key = tag.get('key')
+                tag_value = tag.get('value')
+                if tag_key and tag_value:
+                    values_by_key.setdefault(tag_key.lower(), tag_value)
+        
+        for key in self._env_keys_lower:
+            if key in values_by_key:
+                return values_by_key[key]
         
         return None
     
@@ -67,56 +129,70 @@ class DataNormalizer:
                     return value
         
         # Fallback to identifier
-        if resource_type == 'ec2_instance':
-            return resource.get('resourceId', '') or resource.get('assetId', '') or resource.get('id', 'unknown')
-        elif resource_type == 'db_instance':
-            return resource.get('resourceId', '') or resource.get('assetId', '') or resource.get('id', 'unknown')
-        else:
-            return resource.get('assetId', '') or resource.get('resourceId', '') or resource.get('id', 'unknown')
+        if resource_type in ('ec2_instance', 'db_instance'):
+            return _first_nonempty(resource, _ID_KEYS, 'unknown')
+        return _first_nonempty(resource, _SNAPSHOT_ID_KEYS, 'unknown')
     
     def extract_state(self, resource: Dict[str, Any], resource_type: str) -> str:
         """
         Extract resource state from documented fields.
         """
-        # Extract state using actual Firefly API field names
-        if resource_type == 'ec2_instance':
-            # Check multiple possible state fields
-            state = (resource.get('state') or 
-                    resource.get('instance_state') or 
-                    resource.get('resource_status'))
-        elif resource_type == 'db_instance':
-            state = (resource.get('state') or 
-                    resource.get('db_instance_status') or 
-                    resource.get('resource_status'))
-        else:
-            state = (resource.get('state') or 
-                    resource.get('resource_status'))
+        # Extract state using actual Firefly API field names, checking multiple possible state fields
+        keys = self._STATE_KEYS.get(resource_type, self._DEFAULT_STATE_KEYS)
+        return _first_nonempty(resource, keys, 'unknown')
+    
+    @staticmethod
+    @lru_cache(maxsize=100000)
+    def _parse_date_cached(date_str: str) -> datetime:
+        """
+        Parse date string to UTC datetime, memoized by the raw string.
+        """
+        try:
+            # Fast path for ISO 8601, the format the Firefly API returns
+            if ciso8601 is not None:
+                dt = ciso8601.parse_datetime(date_str)
+            else:
+                dt = datetime.fromisoformat(date_str)
+        except ValueError:
+            dt = parser.parse(date_str)
         
-        return state if state else 'unknown'
+        # Ensure it's timezone-aware, default to UTC if not
+        if dt.tzinfo is None:
+            return dt.replace(tzinfo=timezone.utc)
+        
+        # Convert to UTC
+        return dt.astimezone(timezone.utc)
     
-    def parse_date(self, date_str: str) -> Optional[datetime]:
+    def parse_date(self, date_str: Union[str, int, float]) -> Optional[datetime]:
         """
-        Parse date string to UTC datetime.
+        Parse date string (or epoch timestamp) to UTC datetime.
         """
         if not date_str:
             return None
         
         try:
-            # Parse the date string
-            dt = parser.parse(date_str)
-            
-            # Ensure it's timezone-aware, default to UTC if not
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            else:
-                # Convert to UTC
-                dt = dt.astimezone(timezone.utc)
-            
-            return dt
-        except (ValueError, TypeError) as e:
+            # Epoch timestamps (as in resourceCreationDate) skip string parsing entirely
+            if isinstance(date_str, (int, float)):
+                return datetime.fromtimestamp(date_str, tz=timezone.utc)
+            return self._parse_date_cached(date_str)
+        except (ValueError, TypeError, OverflowError, OSError) as e:
             logger.warning(f"Could not parse date '{date_str}': {e}")
             return None
     
+    @contextmanager
+    def batch_clock(self) -> Iterator[datetime]:
+        """
+        Read the clock once and use it for every age calculated inside the block,
+        so all rows of one export share a reference time (even across UTC midnight).
+        """
+        previous = self._batch_now, self._batch_now_epoch
+        self._batch_now = datetime.now(timezone.utc)
+        self._batch_now_epoch = self._batch_now.timestamp()
+        try:
+            yield self._batch_now
+        finally:
+            self._batch_now, self._batch_now_epoch = previous
+    
     def calculate_age_days(self, creation_date: datetime) -> int:
         """
         Calculate age in days from creation date.
@@ -124,13 +200,23 @@ class DataNormalizer:
         if not creation_date:
             return 0
         
-        now = datetime.now(timezone.utc)
+        now = self._batch_now or datetime.now(timezone.utc)
         age_delta = now - creation_date
         age_days = int(age_delta.days)
         
         # Return 0 for future dates (negative age)
         return max(0, age_days)
     
+    def calculate_age_days_from_epoch(self, creation_epoch: float) -> int:
+        """
+        Calculate age in days from an epoch creation timestamp, without datetime arithmetic.
+        """
+        now_epoch = self._batch_now_epoch or time.time()
+        age_days = int((now_epoch - creation_epoch) // _SECONDS_PER_DAY)
+        
+        # Return 0 for future dates (negative age)
+        return age_days if age_days > 0 else 0
+    
     def normalize_snapshot_data(self, snapshot: Dict[str, Any], snapshot_type: str,
                                parent: Optional[Dict[str, Any]] = None,
                                orphaned: bool = False) -> Dict[str, Any]:
@@ -139,7 +225,7 @@ class DataNormalizer:
         """
         # Use Firefly API field names
         normalized = {
-            'snapshot_id': snapshot.get('assetId', '') or snapshot.get('resourceId', '') or snapshot.get('id', ''),
+            'snapshot_id': _first_nonempty(snapshot, _SNAPSHOT_ID_KEYS),
             'snapshot_type': snapshot_type,
             'creation_date': '',
             'size_gb': '',
@@ -162,52 +248,21 @@ class DataNormalizer:
             try:
                 creation_date = datetime.fromtimestamp(creation_date_str, tz=timezone.utc)
                 normalized['creation_date'] = creation_date.isoformat()
-                normalized['age_days'] = self.calculate_age_days(creation_date)
+                normalized['age_days'] = self.calculate_age_days_from_epoch(creation_date_str)
             except (ValueError, TypeError):
                 logger.warning("Invalid creation date format — not found in snapshot schema")
         else:
             logger.warning("Missing creation date — not found in snapshot schema")
         
         # Extract size - using actual Firefly API field names
-        if snapshot_type == 'ebs':
-            tf_object = snapshot.get('tfObject', {})
-            storage_tier = tf_object.get('storage_tier')
-            # Store storage_tier for cost calculation
-            normalized['storage_tier'] = storage_tier if storage_tier else ''
-            size_gb = None
-            
-            if storage_tier == 'standard':
-                # For standard tier: try full_snapshot_size_in_bytes first, fallback to volume_size
-                full_size_bytes = tf_object.get('full_snapshot_size_in_bytes')
-                if full_size_bytes is not None:
-                    # Convert bytes to GB
-                    size_gb = full_size_bytes / (1024 * 1024 * 1024)
-                    logger.debug(f"Using full_snapshot_size_in_bytes for standard tier snapshot {snapshot.get('assetId', '') or snapshot.get('resourceId', '')}")
-                else:
-                    # Fallback to volume_size if full_snapshot_size_in_bytes is missing
-                    size_gb = tf_object.get('volume_size')
-                    if size_gb is not None:
-                        logger.debug(f"Using volume_size as fallback for standard tier snapshot {snapshot.get('assetId', '') or snapshot.get('resourceId', '')}")
-            else:
-                # For archive tier or any other tier (including None/missing): always use volume_size
-                size_gb = tf_object.get('volume_size')
-                if size_gb is not None:
-                    logger.debug(f"Using volume_size for {storage_tier or 'unspecified'} tier snapshot {snapshot.get('assetId', '') or snapshot.get('resourceId', '')}")
-            
-            # Log detailed warning if size is still missing
-            if size_gb is None:
-                snapshot_id = snapshot.get('assetId', '') or snapshot.get('resourceId', '') or 'unknown'
-                logger.warning(
-                    f"Missing size information for snapshot {snapshot_id}: "
-                    f"storage_tier={storage_tier}, "
-                    f"full_snapshot_size_in_bytes={tf_object.get('full_snapshot_size_in_bytes')}, "
-                    f"volume_size={tf_object.get('volume_size')}"
-                )
-        elif snapshot_type == 'db':
-            size_gb = snapshot.get('tfObject', {}).get('allocated_storage')
+        handler = self._size_handlers.get(snapshot_type)
+        if handler:
+            size_gb, storage_tier = handler(snapshot, normalized['snapshot_id'])
         else:
-            size_gb = None
-            
+            size_gb, storage_tier = None, ''
+        # Store storage_tier for cost calculation
+        normalized['storage_tier'] = storage_tier
+        
         if size_gb is not None:
             normalized['size_gb'] = str(size_gb)
         else:
@@ -224,7 +279,7 @@ class DataNormalizer:
         region = snapshot.get('region') or snapshot.get('availabilityZone')
         if region:
             # Extract region from AZ (e.g., "us-east-1a" -> "us-east-1")
-            if region.endswith(('a', 'b', 'c', 'd', 'e', 'f')):
+            if region[-1:] in _AZ_SUFFIXES:
                 region = region[:-1]
             normalized['region'] = region
         else:
@@ -233,7 +288,8 @@ class DataNormalizer:
             if arn and ':' in arn:
                 # ARN format: arn:aws:ec2:region:account:volume/vol-id
                 # or: arn:aws:ec2:region::snapshot/snap-id
-                parts = arn.split(':')
+                # Only the region field is needed, so stop splitting after it
+                parts = arn.split(':', 4)
                 if len(parts) >= 4:
                     region = parts[3]
                     normalized['region'] = region
@@ -250,14 +306,15 @@ class DataNormalizer:
             # Check if tagsList has any content
             tags_list = snapshot.get('tagsList', [])
             if tags_list:
-                # Convert tagsList to dict format for compatibility
-                tags_dict = {}
-                for tag in tags_list:
-                    if isinstance(tag, dict) and 'key' in tag and 'value' in tag:
-                        tags_dict[tag['key']] = tag['value']
-                    elif isinstance(tag, str) and '=' in tag:
-                        key, value = tag.split('=', 1)
-                        tags_dict[key] = value
+                # Convert tagsList to dict format for compatibility. A response uses one
+                # shape for the whole list, so pick the conversion from the first tag
+                first_tag = tags_list[0]
+                if isinstance(first_tag, dict):
+                    tags_dict = {tag['key']: tag['value'] for tag in tags_list if 'key' in tag and 'value' in tag}
+                elif isinstance(first_tag, str):
+                    tags_dict = dict(tag.split('=', 1) for tag in tags_list if '=' in tag)
+                else:
+                    tags_dict = {}
                 if tags_dict:
                     normalized['environment'] = self.extract_environment(tags_dict) or ''
                 # No warning for missing tags - this is normal for many AWS resources
@@ -267,12 +324,12 @@ class DataNormalizer:
         if parent and not orphaned:
             if snapshot_type == 'ebs':
                 normalized['parent_resource_type'] = 'ec2_instance'
-                normalized['parent_resource_id'] = parent.get('resourceId', '') or parent.get('assetId', '') or parent.get('id', '')
+                normalized['parent_resource_id'] = _first_nonempty(parent, _ID_KEYS)
                 normalized['parent_name'] = self.extract_name(parent, 'ec2_instance')
                 normalized['parent_state'] = self.extract_state(parent, 'ec2_instance')
             elif snapshot_type == 'db':
                 normalized['parent_resource_type'] = 'db_instance'
-                normalized['parent_resource_id'] = parent.get('resourceId', '') or parent.get('assetId', '') or parent.get('id', '')
+                normalized['parent_resource_id'] = _first_nonempty(parent, _ID_KEYS)
                 normalized['parent_name'] = self.extract_name(parent, 'db_instance')
                 normalized['parent_state'] = self.extract_state(parent, 'db_instance')
         else:
@@ -288,29 +345,96 @@ class DataNormalizer:
         
         return normalized
     
+    def _ebs_size(self, snapshot: Dict[str, Any], snapshot_id: str) -> Tuple[Optional[Any], str]:
+        """
+        Select EBS snapshot size (GB) based on its storage tier.
+        """
+        tf_object = snapshot.get('tfObject', {})
+        storage_tier = tf_object.get('storage_tier')
+        debug = logger.isEnabledFor(logging.DEBUG)
+        size_gb = None
+        
+        if storage_tier == 'standard':
+            # For standard tier: try full_snapshot_size_in_bytes first, fallback to volume_size
+            full_size_bytes = tf_object.get('full_snapshot_size_in_bytes')
+            if full_size_bytes is not None:
+                # Convert bytes to GB
+                size_gb = full_size_bytes * _INV_BYTES_PER_GB
+                if debug:
+                    logger.debug(f"Using full_snapshot_size_in_bytes for standard tier snapshot {snapshot_id}")
+            else:
+                # Fallback to volume_size if full_snapshot_size_in_bytes is missing
+                size_gb = tf_object.get('volume_size')
+                if size_gb is not None and debug:
+                    logger.debug(f"Using volume_size as fallback for standard tier snapshot {snapshot_id}")
+        else:
+            # For archive tier or any other tier (including None/missing): always use volume_size
+            size_gb = tf_object.get('volume_size')
+            if size_gb is not None and debug:
+                logger.debug(f"Using volume_size for {storage_tier or 'unspecified'} tier snapshot {snapshot_id}")
+        
+        # Log detailed warning if size is still missing
+        if size_gb is None:
+            logger.warning(
+                f"Missing size information for snapshot {snapshot_id or 'unknown'}: "
+                f"storage_tier={storage_tier}, "
+                f"full_snapshot_size_in_bytes={tf_object.get('full_snapshot_size_in_bytes')}, "
+                f"volume_size={tf_object.get('volume_size')}"
+            )
+        
+        return size_gb, storage_tier if storage_tier else ''
+    
+    def _db_size(self, snapshot: Dict[str, Any], snapshot_id: str) -> Tuple[Optional[Any], str]:
+        """
+        Select DB snapshot size (GB) from allocated storage.
+        """
+        return snapshot.get('tfObject', {}).get('allocated_storage'), ''
+    
+    def _price_per_gb_month(self, region: str, snapshot_type: str, tier: Optional[str]) -> Optional[float]:
+        """Resolve the per GB-month price, memoized per (region, snapshot_type, tier)."""
+        key = (region, snapshot_type, tier)
+        try:
+            return self._price_cache[key]
+        except KeyError:
+            pass
+        
+        if snapshot_type == 'ebs':
+            price = self.pricing_fetcher.get_ebs_price(region, tier)
+        elif snapshot_type == 'db':
+            price = self.pricing_fetcher.get_rds_price(region)
+        else:
+            price = None
+        
+        self._price_cache[key] = price
+        return price
+    
     def calculate_monthly_cost(self, snapshot_data: Dict[str, Any]) -> str:
         """Calculate monthly cost for a snapshot."""
-        self.pricing_fetcher.ensure_pricing_loaded() # Ensure pricing data is loaded
+        if not self._pricing_ready:  # Load pricing data on first use only
+            self.pricing_fetcher.ensure_pricing_loaded()
+            self._pricing_ready = True
         size_gb = snapshot_data.get('size_gb')
         region = snapshot_data.get('region')
         snapshot_type = snapshot_data.get('snapshot_type')
         storage_tier = snapshot_data.get('storage_tier')  # Get storage tier for EBS snapshots
         
-        if not all([size_gb, region, snapshot_type]):
+        if not size_gb or not region or not snapshot_type:
             return 'prices_not_provided'
         try:
             # Pass storage_tier for EBS snapshots (None for DB snapshots)
             tier = storage_tier if storage_tier and snapshot_type == 'ebs' else None
-            cost = self.pricing_fetcher.calculate_monthly_cost(float(size_gb), region, snapshot_type, tier)
-            if cost is not None:
-                return f"${cost:.4f}"
+            price = self._price_per_gb_month(region, snapshot_type, tier)
+            if price is not None:
+                return f"${float(size_gb) * price:.4f}"
         except (ValueError, TypeError):
             pass
         return 'prices_not_provided'
     
     def calculate_cost_since_creation(self, snapshot_data: Dict[str, Any]) -> str:
         """Calculate total cost since creation."""
-        self.pricing_fetcher.ensure_pricing_loaded() # Ensure pricing data is loaded
+        if not self._pricing_ready:  # Load pricing data on first use only
+            self.pricing_fetcher.ensure_pricing_loaded()
+            self._pricing_ready = True
         size_gb = snapshot_data.get('size_gb')
         region = snapshot_data.get('region')
         snapshot_type = snapshot_data.get('snapshot_type')
@@ -318,14 +442,14 @@ class DataNormalizer:
         storage_tier = snapshot_data.get('storage_tier')  # Get storage tier for EBS snapshots
         
         # Fixed: age_days can be 0, which is falsy. Check for None instead.
-        if not all([size_gb, region, snapshot_type]) or age_days is None:
+        if not size_gb or not region or not snapshot_type or age_days is None:
             return 'prices_not_provided'
         try:
             # Pass storage_tier for EBS snapshots (None for DB snapshots)
             tier = storage_tier if storage_tier and snapshot_type == 'ebs' else None
-            cost = self.pricing_fetcher.calculate_cost_since_creation(float(size_gb), region, snapshot_type, int(age_days), tier)
-            if cost is not None:
-                return f"${cost:.4f}"
+            price = self._price_per_gb_month(region, snapshot_type, tier)
+            if price is not None:
+                return f"${float(size_gb) * price * (int(age_days) / DAYS_PER_MONTH):.4f}"
         except (ValueError, TypeError):
             pass
         return 'prices_not_provided'
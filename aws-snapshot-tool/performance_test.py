@@ -4,6 +4,7 @@ Performance Test Script - Demonstrates the performance improvements
 from batch processing and caching optimizations.
 """
 
+import gc
 import time
 import logging
 from firefly_client import FireflyClient
@@ -13,29 +14,36 @@ from resolver import ParentResolver
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def test_individual_lookup(client, resolver, snapshots, account_id=None, region=None):
+def test_individual_lookup(resolver, snapshots, account_id=None, region=None):
     """Test individual lookup performance (old method)"""
     logger.info("Testing individual lookup performance...")
-    start_time = time.time()
-    
-    results = []
-    for snapshot in snapshots:
-        parent, orphaned = resolver.resolve_ebs_parent(snapshot, account_id, region)
-        results.append((parent, orphaned))
+    gc.disable()  # Keep GC pauses out of the measurement
+    try:
+        start_time = time.perf_counter()
+        results = [resolver.resolve_ebs_parent(snapshot, account_id, region) for snapshot in snapshots]
+        elapsed = time.perf_counter() - start_time
+    finally:
+        gc.enable()
     
-    elapsed = time.time() - start_time
-    logger.info(f"Individual lookup: {len(snapshots)} snapshots in {elapsed:.2f}s ({elapsed/len(snapshots):.3f}s per snapshot)")
+    count = len(snapshots)
+    per_snapshot = elapsed / count if count else 0.0
+    logger.info(f"Individual lookup: {count} snapshots in {elapsed:.2f}s ({per_snapshot:.3f}s per snapshot)")
     return results, elapsed
 
-def test_batch_lookup(client, resolver, snapshots, account_id=None, region=None):
+def test_batch_lookup(resolver, snapshots, account_id=None, region=None):
     """Test batch lookup performance (new method)"""
     logger.info("Testing batch lookup performance...")
-    start_time = time.time()
-    
-    results = resolver.resolve_ebs_parents_batch(snapshots, account_id, region)
+    gc.disable()  # Keep GC pauses out of the measurement
+    try:
+        start_time = time.perf_counter()
+        results = resolver.resolve_ebs_parents_batch(snapshots, account_id, region)
+        elapsed = time.perf_counter() - start_time
+    finally:
+        gc.enable()
     
-    elapsed = time.time() - start_time
-    logger.info(f"Batch lookup: {len(snapshots)} snapshots in {elapsed:.2f}s ({elapsed/len(snapshots):.3f}s per snapshot)")
+    count = len(snapshots)
+    per_snapshot = elapsed / count if count else 0.0
+    logger.info(f"Batch lookup: {count} snapshots in {elapsed:.2f}s ({per_snapshot:.3f}s per snapshot)")
     return results, elapsed
 
 def main():
@@ -69,14 +77,19 @@ def main():
         test_snapshots = snapshots[:10]
         logger.info(f"Testing with {len(test_snapshots)} snapshots")
         
-        # Test individual lookup
+        # Warm up connections and imports with one discarded lookup
+        resolver.resolve_ebs_parent(test_snapshots[0])
+        
+        # Test individual lookup, starting from an empty instance cache
+        resolver.clear_caches()
         individual_results, individual_time = test_individual_lookup(
-            client, resolver, test_snapshots
+            resolver, test_snapshots
         )
         
-        # Test batch lookup
+        # Test batch lookup, also from an empty cache
+        resolver.clear_caches()
         batch_results, batch_time = test_batch_lookup(
-            client, resolver, test_snapshots
+            resolver, test_snapshots
         )
         
         # Calculate improvement
@@ -3,19 +3,133 @@ Parent Resource Resolver - Logic to resolve parents only via documented relation
 """
 
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, Tuple, List
-from firefly_client import FireflyClient
+from firefly_client import FireflyClient, asset_region
 
 logger = logging.getLogger(__name__)
 
+# Seconds an EC2 instance inventory fetched for per-snapshot resolution stays fresh
+INSTANCE_CACHE_TTL = 60
+
+# Shared read-only default for missing tfObject dicts
+_EMPTY: Dict[str, Any] = {}
+
+
+def _extract_volume_id(snapshot: Dict[str, Any]) -> Optional[str]:
+    """
+    Extract the source volume ID from an EBS snapshot, or None.
+    """
+    volume_id = ((snapshot.get('tfObject') or _EMPTY).get('volume_id')
+                 or snapshot.get('volumeId')
+                 or snapshot.get('volume_id'))
+    if not volume_id:
+        # ARN format: arn:aws:ec2:region:account:volume/vol-id
+        arn = snapshot.get('arn', '')
+        if arn and 'volume' in arn:
+            volume_id = arn.split('/')[-1]
+    return volume_id or None
+
+
+def _index_instance_volumes(index: Dict[str, Dict[str, Any]], instance: Dict[str, Any]) -> None:
+    """
+    Add each volume_id referenced in the instance's ebs_block_device to index,
+    keeping any instance already recorded for that volume.
+    """
+    for device in (instance.get('tfObject') or _EMPTY).get('ebs_block_device') or ():
+        vol_id = device.get('volume_id')
+        if vol_id:
+            index.setdefault(vol_id, instance)
+
+
+def _build_volume_to_instance_index(instances: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Map each volume_id referenced in an instance's ebs_block_device to that instance.
+    The first instance referencing a volume wins.
+    """
+    index = {}
+    for instance in instances:
+        _index_instance_volumes(index, instance)
+    return index
+
+
+def _extract_db_instance_id(snapshot: Dict[str, Any]) -> Optional[str]:
+    """
+    Extract the source DB instance identifier from a DB snapshot, or None.
+    """
+    return ((snapshot.get('tfObject') or _EMPTY).get('db_instance_identifier')
+            or snapshot.get('dbInstanceIdentifier')
+            or snapshot.get('db_instance_identifier')
+            or snapshot.get('sourceDbInstanceIdentifier'))
+
+
+def _build_db_instance_index(db_instances: List[Dict[str, Any]]) -> Dict[Tuple[str, Optional[str]], Dict[str, Any]]:
+    """
+    Map (identifier, region) to the DB instance, for each of its identifiers (resourceId, name
+    and tfObject.identifier). Names are only unique per region, so the region is part of the key.
+    """
+    index = {}
+    for instance in db_instances:
+        region = asset_region(instance)
+        for key in (instance.get('resourceId'), instance.get('name'),
+                    (instance.get('tfObject') or _EMPTY).get('identifier')):
+            if key:
+                index.setdefault((key, region), instance)
+    return index
+
 
 class ParentResolver:
     """
     Resolves parent resources for snapshots using only documented Firefly API relationships.
     """
     
+    __slots__ = ('client', '_instance_cache', '_db_parent_cache')
+    
     def __init__(self, client: FireflyClient):
         self.client = client
+        # (account_id, region) -> [expires_at, unread instances iterator (None once exhausted), volume_id -> instance]
+        self._instance_cache: Dict[Tuple[Optional[str], Optional[str]], List[Any]] = {}
+        # (db_instance_identifier, account_id, region) -> (parent_data, orphaned)
+        self._db_parent_cache: Dict[Tuple[str, Optional[str], Optional[str]], Tuple[Optional[Dict[str, Any]], bool]] = {}
+    
+    def clear_caches(self):
+        """Drop cached instance inventories and DB parent lookups."""
+        self._instance_cache.clear()
+        self._db_parent_cache.clear()
+    
+    def _find_instance_for_volume(self, volume_id: str, account_id: Optional[str] = None,
+                                  region: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return the EC2 instance whose ebs_block_device references volume_id, or None.
+        The instance inventory is paged in lazily, only as far as needed; what has been read is
+        indexed and cached for INSTANCE_CACHE_TTL seconds, and later lookups resume from there.
+        """
+        key = (account_id, region)
+        cached = self._instance_cache.get(key)
+        if not cached or cached[0] <= time.monotonic():
+            cached = [time.monotonic() + INSTANCE_CACHE_TTL,
+                      iter(self.client.list_ec2_instances(account_id, region)), {}]
+            self._instance_cache[key] = cached
+        
+        _, instances_iter, volume_instance_map = cached
+        instance = volume_instance_map.get(volume_id)
+        if instance is not None or instances_iter is None:
+            return instance
+        
+        try:
+            for instance in instances_iter:
+                _index_instance_volumes(volume_instance_map, instance)
+                # Stop paging as soon as the volume has an owner
+                if volume_id in volume_instance_map:
+                    return volume_instance_map[volume_id]
+        except Exception:
+            # Don't keep a half-read inventory behind a failed page
+            self._instance_cache.pop(key, None)
+            raise
+        
+        cached[1] = None  # inventory fully read
+        return None
     
     def resolve_ebs_parent(self, snapshot: Dict[str, Any], account_id: Optional[str] = None,
                            region: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
@@ -24,21 +138,10 @@ class ParentResolver:
         Returns (parent_data, orphaned) tuple.
         """
         # Extract volume ID from EBS snapshot - using actual Firefly API field names
-        volume_id = snapshot.get('tfObject', {}).get('volume_id')
-        
+        volume_id = _extract_volume_id(snapshot)
         if not volume_id:
-            # Fallback to other possible fields
-            volume_id = snapshot.get('volumeId') or snapshot.get('volume_id')
-            if not volume_id:
-                # Try to extract from ARN or other available fields
-                arn = snapshot.get('arn', '')
-                if arn and 'volume' in arn:
-                    # ARN format: arn:aws:ec2:region:account:volume/vol-id
-                    volume_id = arn.split('/')[-1]
-                    logger.info(f"Extracted volume ID from ARN: {volume_id}")
-                else:
-                    logger.debug("Missing volume ID — not found in EBS snapshot schema (this is normal for some snapshots)")
-                    return None, True
+            logger.debug("Missing volume ID — not found in EBS snapshot schema (this is normal for some snapshots)")
+            return None, True
         
         # Use batch volume lookup if available (this will be called from the optimized main loop)
         # For now, fall back to individual lookup
@@ -62,42 +165,18 @@ class ParentResolver:
             if not instance_id:
                 instance_id = volume.get('instanceId') or volume.get('instance_id') or volume.get('attachedInstanceId')
         
-        # Strategy 2: If volume attachments are empty, search instances for this volume
+        # Strategy 2: If volume attachments are empty or the volume is gone,
+        # search instances for a reference to this volume (instance-first resolution)
         found_instance = None
         if not instance_id:
             logger.debug(f"Volume {volume_id} has no attachments, searching instances for volume reference...")
             try:
                 # Search for instances that reference this volume
-                instances = list(self.client.list_ec2_instances(account_id, region))
-                for instance in instances:
-                    ebs_devices = instance.get('tfObject', {}).get('ebs_block_device', [])
-                    for device in ebs_devices:
-                        if device.get('volume_id') == volume_id:
-                            instance_id = instance.get('resourceId')
-                            found_instance = instance  # Store the instance data we found
-                            logger.info(f"Found instance {instance_id} referencing volume {volume_id} via ebs_block_device")
-                            break
-                    if instance_id:
-                        break
-            except Exception as e:
-                logger.debug(f"Error searching instances for volume {volume_id}: {e}")
-        
-        # Strategy 3: If volume lookup fails entirely, try instance-first resolution
-        if not instance_id:
-            logger.debug(f"Volume {volume_id} not found in inventory, trying instance-first resolution...")
-            try:
-                # Search for instances that reference this volume
-                instances = list(self.client.list_ec2_instances(account_id, region))
-                for instance in instances:
-                    ebs_devices = instance.get('tfObject', {}).get('ebs_block_device', [])
-                    for device in ebs_devices:
-                        if device.get('volume_id') == volume_id:
-                            instance_id = instance.get('resourceId')
-                            found_instance = instance  # Store the instance data we found
-                            logger.info(f"Found instance {instance_id} referencing volume {volume_id} via ebs_block_device (instance-first resolution)")
-                            break
-                    if instance_id:
-                        break
+                instance = self._find_instance_for_volume(volume_id, account_id, region)
+                if instance:
+                    instance_id = instance.get('resourceId')
+                    found_instance = instance  # Store the instance data we found
+                    logger.info(f"Found instance {instance_id} referencing volume {volume_id} via ebs_block_device")
             except Exception as e:
                 logger.debug(f"Error searching instances for volume {volume_id}: {e}")
         
@@ -128,48 +207,43 @@ class ParentResolver:
         if not snapshots:
             return {}
         
-        # Extract all volume IDs from snapshots
-        volume_ids = []
-        snapshot_volume_map = {}  # snapshot_id -> volume_id
+        # Extract all volume IDs from snapshots; snapshots without one are orphaned up front
+        volume_ids = set()  # many snapshots can share a volume, so request each once
+        resolvable = []  # (snapshot_id, volume_id)
+        results = {}
         
         for snapshot in snapshots:
-            volume_id = snapshot.get('tfObject', {}).get('volume_id')
-            if not volume_id:
-                volume_id = snapshot.get('volumeId') or snapshot.get('volume_id')
-                if not volume_id:
-                    arn = snapshot.get('arn', '')
-                    if arn and 'volume' in arn:
-                        volume_id = arn.split('/')[-1]
+            snapshot_id = snapshot.get('resourceId')
+            volume_id = _extract_volume_id(snapshot)
             
             if volume_id:
-                volume_ids.append(volume_id)
-                snapshot_volume_map[snapshot.get('resourceId')] = volume_id
+                volume_ids.add(volume_id)
+                resolvable.append((snapshot_id, volume_id))
+            else:
+                results[snapshot_id] = (None, True)
         
-        # Batch fetch all volumes
-        volumes = self.client.get_volumes_batch(volume_ids, account_id, region)
+        # Nothing to resolve, so skip the region-wide volume and instance fetches
+        if not volume_ids:
+            return results
         
-        # Batch fetch all EC2 instances
-        instances = self.client.get_ec2_instances_batch(account_id, region)
+        # Batch fetch all volumes and EC2 instances concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            volumes_future = executor.submit(self.client.get_volumes_batch, list(volume_ids), account_id, region)
+            instances_future = executor.submit(self.client.get_ec2_instances_batch, account_id, region)
+            volumes = volumes_future.result()
+            instances = instances_future.result()
         
-        # Build instance lookup map for ebs_block_device references
-        instance_volume_map = {}  # volume_id -> instance
+        # Build instance lookup maps by ID and by ebs_block_device references
+        instance_by_id = {}  # resourceId -> instance
         for instance in instances:
-            ebs_devices = instance.get('tfObject', {}).get('ebs_block_device', [])
-            for device in ebs_devices:
-                vol_id = device.get('volume_id')
-                if vol_id:
-                    instance_volume_map[vol_id] = instance
+            resource_id = instance.get('resourceId')
+            if resource_id:
+                instance_by_id.setdefault(resource_id, instance)
+        instance_volume_map = _build_volume_to_instance_index(instances)  # volume_id -> instance
         
-        # Resolve parents for each snapshot
-        results = {}
-        for snapshot in snapshots:
-            snapshot_id = snapshot.get('resourceId')
-            volume_id = snapshot_volume_map.get(snapshot_id)
-            
-            if not volume_id:
-                results[snapshot_id] = (None, True)
-                continue
-            
+        # Resolve parents for each snapshot with a volume ID
+        pending = {}  # snapshot_id -> instance_id not found in the batch
+        for snapshot_id, volume_id in resolvable:
             # Check volume attachments first
             volume = volumes.get(volume_id)
             instance_id = None
@@ -188,22 +262,24 @@ class ParentResolver:
             # Get instance details if found
             if instance_id:
                 # Find instance in our batch-fetched instances
-                for instance in instances:
-                    if instance.get('resourceId') == instance_id:
-                        results[snapshot_id] = (instance, False)
-                        break
+                instance = instance_by_id.get(instance_id)
+                if instance:
+                    results[snapshot_id] = (instance, False)
                 else:
-                    # Instance not in batch, fetch individually
-                    try:
-                        instance = self.client.get_ec2_instance_details(instance_id, account_id, region)
-                        results[snapshot_id] = (instance, False) if instance else (None, True)
-                    except Exception:
-                        results[snapshot_id] = (None, True)
+                    # Instance not in batch, fetch in bulk below
+                    pending[snapshot_id] = instance_id
             elif found_instance:
                 results[snapshot_id] = (found_instance, False)
             else:
                 results[snapshot_id] = (None, True)
         
+        # Fetch instances missing from the batch with bulk lookups, once per instance
+        if pending:
+            details = self.client.get_ec2_instances_by_ids(list(set(pending.values())), account_id, region)
+            for snapshot_id, instance_id in pending.items():
+                instance = details.get(instance_id)
+                results[snapshot_id] = (instance, False) if instance else (None, True)
+        
         return results
     
     def resolve_db_parent(self, snapshot: Dict[str, Any], account_id: Optional[str] = None,
@@ -213,32 +289,112 @@ class ParentResolver:
         Returns (parent_data, orphaned) tuple.
         """
         # Extract DB instance identifier from DB snapshot - using actual Firefly API field names
-        instance_id = snapshot.get('tfObject', {}).get('db_instance_identifier')
+        instance_id = _extract_db_instance_id(snapshot)
         
         if not instance_id:
-            # Fallback to other possible fields
-            instance_id = snapshot.get('dbInstanceIdentifier') or snapshot.get('db_instance_identifier') or snapshot.get('sourceDbInstanceIdentifier')
-            if not instance_id:
-                # Try to extract from ARN or other available fields
-                arn = snapshot.get('arn', '')
-                if arn and 'db' in arn:
-                    # ARN format: arn:aws:rds:region:account:db-snapshot:snapshot-id
-                    # The source DB instance might be in the snapshot name or other fields
-                    logger.info(f"Extracted DB snapshot ARN: {arn}")
-                    # For now, we'll need to rely on the direct field or leave as orphaned
-                    logger.debug("Missing DB instance identifier — not found in DB snapshot schema (this is normal for some snapshots)")
-                    return None, True
-                else:
-                    logger.debug("Missing DB instance identifier — not found in DB snapshot schema (this is normal for some snapshots)")
-                    return None, True
+            arn = snapshot.get('arn', '')
+            if arn and 'db' in arn:
+                # ARN format: arn:aws:rds:region:account:db-snapshot:snapshot-id
+                # The source DB instance isn't part of the snapshot ARN, so leave as orphaned
+                logger.info(f"Extracted DB snapshot ARN: {arn}")
+            logger.debug("Missing DB instance identifier — not found in DB snapshot schema (this is normal for some snapshots)")
+            return None, True
+        
+        # Snapshots of the same DB instance share a parent, so only look each one up once
+        cache_key = (instance_id, account_id, region)
+        cached = self._db_parent_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
         # Get DB instance details
         instance = self.client.get_db_instance(instance_id, account_id, region)
         if not instance:
             logger.debug(f"Could not resolve DB instance {instance_id} for snapshot {snapshot.get('id')} (this is normal for deleted instances)")
-            return None, True
+            result = (None, True)
+        else:
+            result = (instance, False)
+        
+        self._db_parent_cache[cache_key] = result
+        return result
+    
+    def resolve_db_parents_batch(self, snapshots: List[Dict[str, Any]], account_id: Optional[str] = None,
+                                 region: Optional[str] = None) -> Dict[str, Tuple[Optional[Dict[str, Any]], bool]]:
+        """
+        Batch resolve parent DB instances for multiple DB snapshots.
+        Fetches the DB instance inventory once; only identifiers missing from it are looked up individually.
+        """
+        if not snapshots:
+            return {}
+        
+        db_by_id = _build_db_instance_index(self.client.get_db_instances_batch(account_id, region))
+        
+        results = {}
+        pending = {}  # db_instance_identifier -> snapshots not found in the batch
+        for snapshot in snapshots:
+            snapshot_id = snapshot.get('resourceId')
+            instance_id = _extract_db_instance_id(snapshot)
+            if not instance_id:
+                results[snapshot_id] = (None, True)
+                continue
+            
+            # Snapshots without a known region only match DB instances without one
+            instance = db_by_id.get((instance_id, asset_region(snapshot)))
+            if instance:
+                results[snapshot_id] = (instance, False)
+            else:
+                pending.setdefault(instance_id, []).append(snapshot)
         
-        return instance, False
+        # Resolve identifiers missing from the batch concurrently, once per DB instance
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(8, len(pending))) as executor:
+                resolved = executor.map(
+                    lambda group: self.resolve_db_parent(group[0], account_id, region), pending.values()
+                )
+                for group, result in zip(pending.values(), resolved):
+                    for snapshot in group:
+                        results[snapshot.get('resourceId')] = result
+        
+        return results
+    
+    def resolve_parents_all(self, snapshots_by_type: Dict[str, List[Dict[str, Any]]],
+                            account_id: Optional[str] = None,
+                            region: Optional[str] = None) -> Dict[str, Tuple[Optional[Dict[str, Any]], bool]]:
+        """
+        Batch resolve parents for EBS and DB snapshots of one account/region together.
+        snapshots_by_type maps 'ebs'/'db' to snapshot lists; returns snapshot_id -> (parent_data, orphaned).
+        """
+        ebs_snapshots = snapshots_by_type.get('ebs', [])
+        db_snapshots = snapshots_by_type.get('db', [])
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            ebs_future = executor.submit(self.resolve_ebs_parents_batch, ebs_snapshots, account_id, region)
+            db_future = executor.submit(self.resolve_db_parents_batch, db_snapshots, account_id, region)
+            
+            # A failed batch only costs its own snapshot type a slower per-snapshot pass
+            results = {}
+            for kind, future, snapshots in (('ebs', ebs_future, ebs_snapshots), ('db', db_future, db_snapshots)):
+                try:
+                    results.update(future.result())
+                except Exception as e:
+                    logger.warning(f"Batch {kind.upper()} parent resolution failed, resolving per snapshot: {e}")
+                    results.update(self._resolve_each(snapshots, kind, account_id, region))
+        
+        return results
+    
+    def _resolve_each(self, snapshots: List[Dict[str, Any]], snapshot_type: str,
+                      account_id: Optional[str] = None,
+                      region: Optional[str] = None) -> Dict[str, Tuple[Optional[Dict[str, Any]], bool]]:
+        """
+        Resolve parents one snapshot at a time. Snapshots whose lookup fails are left out of
+        the result rather than reported as orphaned.
+        """
+        results = {}
+        for snapshot in snapshots:
+            snapshot_id = snapshot.get('resourceId')
+            try:
+                results[snapshot_id] = self.resolve_parent(snapshot, snapshot_type, account_id, region)
+            except Exception as e:
+                logger.error(f"Error resolving parent of {snapshot_type} snapshot {snapshot_id}: {e}")
+        return results
     
     def resolve_parent(self, snapshot: Dict[str, Any], snapshot_type: str,
                        account_id: Optional[str] = None, region: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], bool]:
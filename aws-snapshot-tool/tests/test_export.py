@@ -37,7 +37,9 @@ class TestCSVExporter:
             'environment',
             'region',
             'orphaned',
-            'age_days'
+            'age_days',
+            'monthly_cost',
+            'cost_since_creation'
         ]
         
         assert self.exporter.CSV_HEADER == expected_header
@@ -53,7 +55,7 @@ class TestCSVExporter:
         
         with open(self.temp_file.name, 'r') as f:
             content = f.read()
-            expected = 'snapshot_id,snapshot_type,creation_date,size_gb,parent_resource_type,parent_resource_id,parent_name,parent_state,account_id,environment,region,orphaned,age_days\n'
+            expected = 'snapshot_id,snapshot_type,creation_date,size_gb,parent_resource_type,parent_resource_id,parent_name,parent_state,account_id,environment,region,orphaned,age_days,monthly_cost,cost_since_creation\n'
             assert content == expected
     
     def test_write_row(self):
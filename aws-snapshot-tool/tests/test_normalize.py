@@ -7,12 +7,25 @@ from datetime import datetime, timezone
 from normalize import DataNormalizer
 
 
+class StubPricingFetcher:
+    """Pricing fetcher stand-in with fixed per GB-month prices and no network access."""
+    
+    def ensure_pricing_loaded(self):
+        pass
+    
+    def get_ebs_price(self, region, tier=None):
+        return 0.05
+    
+    def get_rds_price(self, region):
+        return 0.095
+
+
 class TestDataNormalizer:
     """Test cases for DataNormalizer class."""
     
     def setup_method(self):
         """Setup test fixtures."""
-        self.normalizer = DataNormalizer()
+        self.normalizer = DataNormalizer(pricing_fetcher=StubPricingFetcher())
     
     def test_extract_environment_priority_order(self):
         """Test environment tag extraction with priority order."""
@@ -141,17 +154,33 @@ class TestDataNormalizer:
         result = self.normalizer.calculate_age_days(future_date)
         assert result == 0
     
+    def test_batch_clock_shares_one_reference_time(self):
+        """Test ages inside batch_clock use one clock reading, even if time moves on."""
+        from datetime import timedelta
+        from unittest.mock import patch
+        
+        with self.normalizer.batch_clock() as now:
+            creation_epoch = now.timestamp() - 5 * 86400
+            # A day passing mid-export must not change the ages of later rows
+            with patch('normalize.time.time', return_value=now.timestamp() + 86400):
+                assert self.normalizer.calculate_age_days_from_epoch(creation_epoch) == 5
+            assert self.normalizer.calculate_age_days(now - timedelta(days=5)) == 5
+        
+        # Outside the block the clock is read per call again
+        with patch('normalize.time.time', return_value=creation_epoch + 6 * 86400):
+            assert self.normalizer.calculate_age_days_from_epoch(creation_epoch) == 6
+    
     def test_normalize_snapshot_data_ebs_with_parent(self):
         """Test normalization of EBS snapshot with resolved parent."""
         snapshot = {
             'assetId': 'snap-1234567890abcdef0',  # Updated to Firefly API field name
             'resourceCreationDate': 1705312200,  # Epoch timestamp for 2024-01-15T10:30:00Z
-            'size': 100,  # Updated to Firefly API field name
+            'tfObject': {  # Size and tags are read from the Terraform object
+                'volume_size': 100,
+                'tags': {'environment': 'prod'}
+            },
             'providerId': '123456789012',  # Updated to Firefly API field name
             'region': 'us-east-1',  # Updated to Firefly API field name
-            'tags': [
-                {'key': 'environment', 'value': 'prod'}
-            ]
         }
         
         parent = {
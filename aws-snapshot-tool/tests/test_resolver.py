@@ -3,236 +3,365 @@ Unit tests for the resolver module.
 """
 
 import pytest
-from unittest.mock import Mock, patch
+from types import MappingProxyType
+from unittest.mock import Mock
+from firefly_client import FireflyClient
 from resolver import ParentResolver
 
+# Keep the resolver tests on one xdist worker so they share the module-scoped mock client
+pytestmark = pytest.mark.xdist_group("resolver")
 
-class TestParentResolver:
-    """Test cases for ParentResolver class."""
+
+# Shared read-only records, reused by every test instead of rebuilt per test
+SNAP_EBS = MappingProxyType({'id': 'snap-1234567890abcdef0', 'volume_id': 'vol-1234567890abcdef0'})
+SNAP_NO_VOLUME = MappingProxyType({'id': 'snap-1234567890abcdef0'})
+VOL_OK = MappingProxyType({'id': 'vol-1234567890abcdef0', 'instance_id': 'i-1234567890abcdef0'})
+VOL_NO_INSTANCE = MappingProxyType({'id': 'vol-1234567890abcdef0'})
+INST_RUN = MappingProxyType({
+    'instance_id': 'i-1234567890abcdef0',
+    'state': MappingProxyType({'name': 'running'})
+})
+SNAP_DB = MappingProxyType({'id': 'snap-1234567890abcdef0', 'db_instance_identifier': 'my-db-instance'})
+SNAP_NO_DB = MappingProxyType({'id': 'snap-1234567890abcdef0'})
+DB_INST = MappingProxyType({'db_instance_identifier': 'my-db-instance', 'db_instance_status': 'available'})
+
+# snapshot, volume, instance, expected_orphaned, get_volume_details calls, get_ec2_instance_details calls,
+# list_ec2_instances calls (instance-first search when there is no attachment)
+EBS_PARENT_CASES = [
+    pytest.param(SNAP_EBS, VOL_OK, INST_RUN, False, 1, 1, 0, id='success'),
+    pytest.param(SNAP_NO_VOLUME, None, None, True, 0, 0, 0, id='missing_volume_id'),
+    pytest.param(SNAP_EBS, None, None, True, 1, 0, 1, id='volume_not_found'),
+    pytest.param(SNAP_EBS, VOL_NO_INSTANCE, None, True, 1, 0, 1, id='missing_instance_id'),
+    pytest.param(SNAP_EBS, VOL_OK, None, True, 1, 1, 0, id='instance_not_found'),
+]
+
+# snapshot, instance, expected_orphaned, get_db_instance calls
+DB_PARENT_CASES = [
+    pytest.param(SNAP_DB, DB_INST, False, 1, id='success'),
+    pytest.param(SNAP_NO_DB, None, True, 0, id='missing_identifier'),
+    pytest.param(SNAP_DB, None, True, 1, id='instance_not_found'),
+]
+
+# snapshot type, snapshot, volume, instance, expected_orphaned
+RESOLVE_PARENT_CASES = [
+    pytest.param('ebs', {'volume_id': 'vol-123'}, {'instance_id': 'i-123'}, {'instance_id': 'i-123'}, False, id='ebs'),
+    pytest.param('db', {'db_instance_identifier': 'db-123'}, None, {'db_instance_identifier': 'db-123'}, False, id='db'),
+    pytest.param('unknown', {'id': 'snap-123'}, None, None, True, id='unknown'),
+]
+
+
+class StubClient:
+    """
+    Lightweight client stub for the table-driven tests: canned return values per method
+    and a log of calls, without Mock's per-call bookkeeping. Like Mock(spec=FireflyClient),
+    only FireflyClient's public methods exist, so a misnamed stub fails loudly.
+    """
     
-    def setup_method(self):
-        """Setup test fixtures."""
-        self.mock_client = Mock()
-        self.resolver = ParentResolver(self.mock_client)
+    __slots__ = ('returns', 'calls')
     
-    def test_resolve_ebs_parent_success(self):
-        """Test successful EBS parent resolution."""
-        snapshot = {
-            'id': 'snap-1234567890abcdef0',
-            'volume_id': 'vol-1234567890abcdef0'
-        }
-        
-        volume = {
-            'id': 'vol-1234567890abcdef0',
-            'instance_id': 'i-1234567890abcdef0'
-        }
-        
-        instance = {
-            'instance_id': 'i-1234567890abcdef0',
-            'state': {'name': 'running'}
-        }
-        
-        self.mock_client.get_volume_details.return_value = volume
-        self.mock_client.get_ec2_instance.return_value = instance
-        
-        parent, orphaned = self.resolver.resolve_ebs_parent(snapshot)
-        
-        assert orphaned is False
-        assert parent == instance
-        self.mock_client.get_volume_details.assert_called_once_with(
-            'vol-1234567890abcdef0', None, None
-        )
-        self.mock_client.get_ec2_instance.assert_called_once_with(
-            'i-1234567890abcdef0', None, None
-        )
-    
-    def test_resolve_ebs_parent_missing_volume_id(self):
-        """Test EBS parent resolution with missing volume_id."""
-        snapshot = {
-            'id': 'snap-1234567890abcdef0'
-            # Missing volume_id
-        }
-        
-        parent, orphaned = self.resolver.resolve_ebs_parent(snapshot)
-        
-        assert orphaned is True
-        assert parent is None
-        self.mock_client.get_volume_details.assert_not_called()
-        self.mock_client.get_ec2_instance.assert_not_called()
+    def __init__(self, **returns):
+        unknown = [name for name in returns if not self._is_client_method(name)]
+        if unknown:
+            raise AttributeError(f"FireflyClient has no method(s) {unknown}")
+        self.returns = returns
+        self.calls = []
     
-    def test_resolve_ebs_parent_volume_not_found(self):
-        """Test EBS parent resolution when volume is not found."""
-        snapshot = {
-            'id': 'snap-1234567890abcdef0',
-            'volume_id': 'vol-1234567890abcdef0'
-        }
-        
-        self.mock_client.get_volume_details.return_value = None
-        
-        parent, orphaned = self.resolver.resolve_ebs_parent(snapshot)
-        
-        assert orphaned is True
-        assert parent is None
-        self.mock_client.get_volume_details.assert_called_once()
-        self.mock_client.get_ec2_instance.assert_not_called()
+    @staticmethod
+    def _is_client_method(name):
+        return not name.startswith('_') and callable(getattr(FireflyClient, name, None))
     
-    def test_resolve_ebs_parent_missing_instance_id(self):
-        """Test EBS parent resolution with missing instance_id in volume."""
-        snapshot = {
-            'id': 'snap-1234567890abcdef0',
-            'volume_id': 'vol-1234567890abcdef0'
-        }
-        
-        volume = {
-            'id': 'vol-1234567890abcdef0'
-            # Missing instance_id
-        }
-        
-        self.mock_client.get_volume_details.return_value = volume
+    def __getattr__(self, name):
+        if not self._is_client_method(name):
+            raise AttributeError(name)
         
-        parent, orphaned = self.resolver.resolve_ebs_parent(snapshot)
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self.returns.get(name)
         
-        assert orphaned is True
-        assert parent is None
-        self.mock_client.get_volume_details.assert_called_once()
-        self.mock_client.get_ec2_instance.assert_not_called()
+        return method
     
-    def test_resolve_ebs_parent_instance_not_found(self):
-        """Test EBS parent resolution when instance is not found."""
-        snapshot = {
-            'id': 'snap-1234567890abcdef0',
-            'volume_id': 'vol-1234567890abcdef0'
-        }
-        
-        volume = {
-            'id': 'vol-1234567890abcdef0',
-            'instance_id': 'i-1234567890abcdef0'
-        }
-        
-        self.mock_client.get_volume_details.return_value = volume
-        self.mock_client.get_ec2_instance.return_value = None
-        
-        parent, orphaned = self.resolver.resolve_ebs_parent(snapshot)
-        
-        assert orphaned is True
-        assert parent is None
-        self.mock_client.get_volume_details.assert_called_once()
-        self.mock_client.get_ec2_instance.assert_called_once()
+    def calls_to(self, name):
+        """Positional arguments of each call made to method name."""
+        return [args for called, args, _ in self.calls if called == name]
+
+
+@pytest.fixture(scope="module")
+def mock_client():
+    """Mock Firefly client shared across this module's tests, limited to FireflyClient's API."""
+    return Mock(spec=FireflyClient)
+
+
+@pytest.fixture
+def resolver(mock_client):
+    """Resolver over the shared mock client, with mock and caches reset between tests."""
+    mock_client.reset_mock(return_value=True, side_effect=True)
+    resolver = ParentResolver(mock_client)
+    resolver.clear_caches()
+    return resolver
+
+
+@pytest.mark.parametrize(
+    "snapshot,volume,instance,expected_orphaned,volume_calls,instance_calls,inventory_calls",
+    EBS_PARENT_CASES
+)
+def test_resolve_ebs_parent(snapshot, volume, instance, expected_orphaned,
+                            volume_calls, instance_calls, inventory_calls):
+    """Test EBS parent resolution through volume attachments, then the instance inventory."""
+    client = StubClient(get_volume_details=volume, get_ec2_instance_details=instance,
+                        list_ec2_instances=[])
     
-    def test_resolve_db_parent_success(self):
-        """Test successful DB parent resolution."""
-        snapshot = {
-            'id': 'snap-1234567890abcdef0',
-            'db_instance_identifier': 'my-db-instance'
-        }
-        
-        instance = {
-            'db_instance_identifier': 'my-db-instance',
-            'db_instance_status': 'available'
-        }
-        
-        self.mock_client.get_db_instance.return_value = instance
-        
-        parent, orphaned = self.resolver.resolve_db_parent(snapshot)
-        
-        assert orphaned is False
-        assert parent == instance
-        self.mock_client.get_db_instance.assert_called_once_with(
-            'my-db-instance', None, None
-        )
+    parent, orphaned = ParentResolver(client).resolve_ebs_parent(snapshot)
     
-    def test_resolve_db_parent_missing_identifier(self):
-        """Test DB parent resolution with missing db_instance_identifier."""
-        snapshot = {
-            'id': 'snap-1234567890abcdef0'
-            # Missing db_instance_identifier
-        }
-        
-        parent, orphaned = self.resolver.resolve_db_parent(snapshot)
-        
-        assert orphaned is True
-        assert parent is None
-        self.mock_client.get_db_instance.assert_not_called()
+    assert orphaned is expected_orphaned
+    assert parent == (None if expected_orphaned else instance)
+    expected_volume_calls = [(snapshot['volume_id'], None, None)] if volume_calls else []
+    assert client.calls_to('get_volume_details') == expected_volume_calls
+    expected_instance_calls = [(volume['instance_id'], None, None)] if instance_calls else []
+    assert client.calls_to('get_ec2_instance_details') == expected_instance_calls
+    assert client.calls_to('list_ec2_instances') == [(None, None)] * inventory_calls
+
+
+def test_resolve_ebs_parent_instance_first_single_inventory_fetch(resolver, mock_client):
+    """Test a deleted volume resolves via ebs_block_device with one inventory fetch."""
+    snapshot = {
+        'id': 'snap-1234567890abcdef0',
+        'volume_id': 'vol-1234567890abcdef0'
+    }
+    
+    instance = {
+        'resourceId': 'i-1234567890abcdef0',
+        'tfObject': {'ebs_block_device': [{'volume_id': 'vol-1234567890abcdef0'}]}
+    }
     
-    def test_resolve_db_parent_instance_not_found(self):
-        """Test DB parent resolution when instance is not found."""
+    mock_client.get_volume_details.return_value = None
+    mock_client.list_ec2_instances.return_value = iter([instance])
+    mock_client.get_ec2_instance_details.return_value = None
+    
+    parent, orphaned = resolver.resolve_ebs_parent(snapshot)
+    
+    assert orphaned is False
+    assert parent == instance
+    assert mock_client.list_ec2_instances.call_count == 1
+    assert mock_client.list_ec2_instances.call_args.args == (None, None)
+
+
+def test_resolve_ebs_parent_instance_first_skips_null_block_devices(resolver, mock_client):
+    """Test instances whose tfObject has ebs_block_device: None are skipped, not treated as an error."""
+    instances = [
+        {'resourceId': 'i-1', 'tfObject': {'ebs_block_device': None}},
+        {'resourceId': 'i-2', 'tfObject': {'ebs_block_device': [{'volume_id': 'vol-2'}]}}
+    ]
+    
+    mock_client.get_volume_details.return_value = None
+    mock_client.list_ec2_instances.return_value = iter(instances)
+    mock_client.get_ec2_instance_details.return_value = None
+    
+    parent, orphaned = resolver.resolve_ebs_parent({'volume_id': 'vol-2'})
+    
+    assert orphaned is False
+    assert parent == instances[1]
+
+
+def test_resolve_ebs_parent_instance_first_stops_paging_on_match(resolver, mock_client):
+    """Test instance-first resolution reads the inventory only as far as the match."""
+    instances = [
+        {'resourceId': 'i-1', 'tfObject': {'ebs_block_device': [{'volume_id': 'vol-1'}]}},
+        {'resourceId': 'i-2', 'tfObject': {'ebs_block_device': [{'volume_id': 'vol-2'}]}}
+    ]
+    consumed = []
+    
+    def list_instances(account_id, region):
+        for instance in instances:
+            consumed.append(instance['resourceId'])
+            yield instance
+    
+    mock_client.get_volume_details.return_value = None
+    mock_client.list_ec2_instances.side_effect = list_instances
+    mock_client.get_ec2_instance_details.return_value = None
+    
+    parent, orphaned = resolver.resolve_ebs_parent({'volume_id': 'vol-1'})
+    assert parent == instances[0]
+    assert consumed == ['i-1']
+    
+    parent, orphaned = resolver.resolve_ebs_parent({'volume_id': 'vol-2'})
+    assert parent == instances[1]
+    assert consumed == ['i-1', 'i-2']
+    assert mock_client.list_ec2_instances.call_count == 1
+    assert mock_client.list_ec2_instances.call_args.args == (None, None)
+
+
+@pytest.mark.parametrize("snapshot,instance,expected_orphaned,db_calls", DB_PARENT_CASES)
+def test_resolve_db_parent(snapshot, instance, expected_orphaned, db_calls):
+    """Test DB parent resolution by db_instance_identifier."""
+    client = StubClient(get_db_instance=instance)
+    
+    parent, orphaned = ParentResolver(client).resolve_db_parent(snapshot)
+    
+    assert orphaned is expected_orphaned
+    assert parent == (None if expected_orphaned else instance)
+    expected_calls = [(snapshot['db_instance_identifier'], None, None)] if db_calls else []
+    assert client.calls_to('get_db_instance') == expected_calls
+
+
+def test_resolve_db_parent_cached_per_instance(resolver, mock_client):
+    """Test DB parent lookups are made once per DB instance."""
+    instance = {
+        'db_instance_identifier': 'my-db-instance',
+        'db_instance_status': 'available'
+    }
+    
+    mock_client.get_db_instance.return_value = instance
+    
+    for snapshot_id in ('snap-1', 'snap-2'):
         snapshot = {
-            'id': 'snap-1234567890abcdef0',
+            'id': snapshot_id,
             'db_instance_identifier': 'my-db-instance'
         }
-        
-        self.mock_client.get_db_instance.return_value = None
-        
-        parent, orphaned = self.resolver.resolve_db_parent(snapshot)
-        
-        assert orphaned is True
-        assert parent is None
-        self.mock_client.get_db_instance.assert_called_once()
-    
-    def test_resolve_parent_ebs_type(self):
-        """Test parent resolution for EBS snapshot type."""
-        snapshot = {'volume_id': 'vol-123'}
-        volume = {'instance_id': 'i-123'}
-        instance = {'instance_id': 'i-123'}
-        
-        self.mock_client.get_volume_details.return_value = volume
-        self.mock_client.get_ec2_instance.return_value = instance
-        
-        parent, orphaned = self.resolver.resolve_parent(snapshot, 'ebs')
+        parent, orphaned = resolver.resolve_db_parent(snapshot)
         
         assert orphaned is False
         assert parent == instance
     
-    def test_resolve_parent_db_type(self):
-        """Test parent resolution for DB snapshot type."""
-        snapshot = {'db_instance_identifier': 'db-123'}
-        instance = {'db_instance_identifier': 'db-123'}
-        
-        self.mock_client.get_db_instance.return_value = instance
-        
-        parent, orphaned = self.resolver.resolve_parent(snapshot, 'db')
-        
-        assert orphaned is False
-        assert parent == instance
+    assert mock_client.get_db_instance.call_count == 1
+    assert mock_client.get_db_instance.call_args.args == ('my-db-instance', None, None)
+
+
+def test_resolve_db_parents_batch_uses_inventory(resolver, mock_client):
+    """Test batch DB resolution only falls back to per-instance lookups on misses."""
+    known = {'resourceId': 'db-known', 'state': 'available'}
+    missing = {'resourceId': 'db-missing', 'state': 'available'}
+    mock_client.get_db_instances_batch.return_value = [known]
+    mock_client.get_db_instance.return_value = missing
     
-    def test_resolve_parent_unknown_type(self):
-        """Test parent resolution for unknown snapshot type."""
-        snapshot = {'id': 'snap-123'}
-        
-        parent, orphaned = self.resolver.resolve_parent(snapshot, 'unknown')
-        
-        assert orphaned is True
-        assert parent is None
+    snapshots = [
+        {'resourceId': 'snap-1', 'db_instance_identifier': 'db-known'},
+        {'resourceId': 'snap-2', 'db_instance_identifier': 'db-missing'},
+        {'resourceId': 'snap-3', 'db_instance_identifier': 'db-missing'},
+        {'resourceId': 'snap-4'}
+    ]
     
-    def test_resolve_with_account_and_region(self):
-        """Test parent resolution with account and region parameters."""
-        snapshot = {
-            'id': 'snap-1234567890abcdef0',
-            'volume_id': 'vol-1234567890abcdef0'
-        }
-        
-        volume = {
-            'id': 'vol-1234567890abcdef0',
-            'instance_id': 'i-1234567890abcdef0'
-        }
-        
-        instance = {
-            'instance_id': 'i-1234567890abcdef0',
-            'state': {'name': 'running'}
-        }
-        
-        self.mock_client.get_volume_details.return_value = volume
-        self.mock_client.get_ec2_instance.return_value = instance
-        
-        parent, orphaned = self.resolver.resolve_ebs_parent(
-            snapshot, '123456789012', 'us-east-1'
-        )
-        
-        assert orphaned is False
-        assert parent == instance
-        self.mock_client.get_volume_details.assert_called_once_with(
-            'vol-1234567890abcdef0', '123456789012', 'us-east-1'
-        )
-        self.mock_client.get_ec2_instance.assert_called_once_with(
-            'i-1234567890abcdef0', '123456789012', 'us-east-1'
-        )
+    results = resolver.resolve_db_parents_batch(snapshots)
+    
+    assert results['snap-1'] == (known, False)
+    assert results['snap-2'] == (missing, False)
+    assert results['snap-3'] == (missing, False)
+    assert results['snap-4'] == (None, True)
+    assert mock_client.get_db_instance.call_count == 1
+    assert mock_client.get_db_instance.call_args.args == ('db-missing', None, None)
+
+
+def test_resolve_db_parents_batch_matches_region(resolver, mock_client):
+    """Test batch DB resolution matches by region and tolerates a null tfObject."""
+    east = {'name': 'db-1', 'region': 'us-east-1', 'tfObject': None}
+    west = {'name': 'db-1', 'region': 'us-west-2', 'tfObject': None}
+    mock_client.get_db_instances_batch.return_value = [east, west]
+    
+    snapshots = [
+        {'resourceId': 'snap-1', 'db_instance_identifier': 'db-1', 'region': 'us-west-2'},
+        {'resourceId': 'snap-2', 'db_instance_identifier': 'db-1',
+         'arn': 'arn:aws:rds:us-east-1:123456789012:snapshot:snap-2'}
+    ]
+    
+    results = resolver.resolve_db_parents_batch(snapshots)
+    
+    assert results == {'snap-1': (west, False), 'snap-2': (east, False)}
+    mock_client.get_db_instance.assert_not_called()
+
+
+def test_resolve_parents_all_falls_back_per_snapshot(resolver, mock_client):
+    """Test a failed DB batch falls back to per-snapshot lookups instead of orphaning everything."""
+    instance = {'resourceId': 'db-1'}
+    mock_client.get_db_instances_batch.side_effect = RuntimeError('inventory unavailable')
+    mock_client.get_db_instance.side_effect = lambda instance_id, *_: instance if instance_id == 'db-1' else None
+    
+    snapshots = {
+        'ebs': [{'resourceId': 'snap-1'}],
+        'db': [
+            {'resourceId': 'snap-2', 'db_instance_identifier': 'db-1'},
+            {'resourceId': 'snap-3', 'db_instance_identifier': 'db-2'}
+        ]
+    }
+    
+    results = resolver.resolve_parents_all(snapshots)
+    
+    assert results == {
+        'snap-1': (None, True),
+        'snap-2': (instance, False),
+        'snap-3': (None, True)
+    }
+
+
+def test_resolve_ebs_parents_batch_fetches_missing_instances_once(resolver, mock_client):
+    """Test batch resolution looks up instances missing from the batch once each."""
+    snapshots = [
+        {'resourceId': 'snap-1', 'tfObject': {'volume_id': 'vol-1'}},
+        {'resourceId': 'snap-2', 'tfObject': {'volume_id': 'vol-1'}},
+        {'resourceId': 'snap-3', 'tfObject': {'volume_id': 'vol-2'}},
+        {'resourceId': 'snap-4'}
+    ]
+    
+    instance = {'resourceId': 'i-1234567890abcdef0'}
+    
+    mock_client.get_volumes_batch.return_value = {
+        'vol-1': {'attachments': [{'instance_id': 'i-1234567890abcdef0'}]}
+    }
+    mock_client.get_ec2_instances_batch.return_value = []
+    mock_client.get_ec2_instances_by_ids.return_value = {'i-1234567890abcdef0': instance}
+    
+    results = resolver.resolve_ebs_parents_batch(snapshots)
+    
+    assert results == {
+        'snap-1': (instance, False),
+        'snap-2': (instance, False),
+        'snap-3': (None, True),
+        'snap-4': (None, True)
+    }
+    assert mock_client.get_ec2_instances_by_ids.call_count == 1
+    assert mock_client.get_ec2_instances_by_ids.call_args.args == (['i-1234567890abcdef0'], None, None)
+    requested_volume_ids = mock_client.get_volumes_batch.call_args[0][0]
+    assert sorted(requested_volume_ids) == ['vol-1', 'vol-2']
+
+
+def test_resolve_ebs_parents_batch_without_volume_ids_skips_fetches(resolver, mock_client):
+    """Test batch resolution makes no API calls when no snapshot has a volume ID."""
+    snapshots = [{'resourceId': 'snap-1'}, {'resourceId': 'snap-2'}]
+    
+    results = resolver.resolve_ebs_parents_batch(snapshots)
+    
+    assert results == {'snap-1': (None, True), 'snap-2': (None, True)}
+    mock_client.get_volumes_batch.assert_not_called()
+    mock_client.get_ec2_instances_batch.assert_not_called()
+
+
+@pytest.mark.parametrize("kind,snapshot,volume,instance,expected_orphaned", RESOLVE_PARENT_CASES)
+def test_resolve_parent(resolver, mock_client, kind, snapshot, volume, instance, expected_orphaned):
+    """Test parent resolution dispatches on snapshot type."""
+    if volume is not None:
+        mock_client.get_volume_details.return_value = volume
+    if instance is not None:
+        mock_client.get_ec2_instance_details.return_value = instance
+        mock_client.get_db_instance.return_value = instance
+    
+    parent, orphaned = resolver.resolve_parent(snapshot, kind)
+    
+    assert orphaned is expected_orphaned
+    assert parent == (None if expected_orphaned else instance)
+
+
+def test_resolve_with_account_and_region(resolver, mock_client):
+    """Test parent resolution with account and region parameters."""
+    snapshot, volume, instance = SNAP_EBS, VOL_OK, INST_RUN
+    
+    mock_client.get_volume_details.return_value = volume
+    mock_client.get_ec2_instance_details.return_value = instance
+    
+    parent, orphaned = resolver.resolve_ebs_parent(
+        snapshot, '123456789012', 'us-east-1'
+    )
+    
+    assert orphaned is False
+    assert parent == instance
+    assert mock_client.get_volume_details.call_count == 1
+    assert mock_client.get_volume_details.call_args.args == ('vol-1234567890abcdef0', '123456789012', 'us-east-1')
+    assert mock_client.get_ec2_instance_details.call_count == 1
+    assert mock_client.get_ec2_instance_details.call_args.args == ('i-1234567890abcdef0', '123456789012', 'us-east-1')
@@ -7,6 +7,7 @@ Firefly Azure bulk codify with Windows compatibility:
 - Fixed multi-line string handling for Terraform
 - Windows-compatible file paths and batch scripts
 - SSL certificate handling for Windows corporate environments
+- Optional faster JSON handling when installed: pip install orjson ijson
 
 QUICK START FOR SSL ISSUES:
 If you get SSL certificate errors, try these solutions in order:
@@ -24,16 +25,38 @@ If you get SSL certificate errors, try these solutions in order:
    If behind a corporate proxy, you may need to configure proxy settings
 """
 
+import argparse
+import functools
+import hashlib
+import itertools
 import json
+import shelve
+import shutil
+import subprocess
 import sys
 import time
 import re
 import os
+import queue
 import ssl
-from typing import Any, Dict, Iterable, List, Tuple
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
 from urllib3.exceptions import InsecureRequestWarning
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 # ================= CONFIG =================
 # NOTE: ACCESS_KEY, SECRET_KEY, AZ_SUBSCRIPTION_ID, DATA_SOURCE_NAME, and RESOURCE_GROUPS
@@ -85,6 +108,16 @@ def normalize_config():
 normalize_config()
 
 SIZE = 10000                 # inventory page size
+INVENTORY_PREFETCH = 256     # inventory assets buffered ahead of codify
+INVENTORY_STREAM_MIN_BYTES = 1 << 20  # stream-parse inventory pages at least this large (needs ijson)
+
+# Codify throughput
+CONCURRENCY = 16             # parallel /codify requests
+MAX_RPS = 50                 # client-side cap on /codify requests per second
+HTTP_POOL_SIZE = 32          # pooled connections per host (keep >= CONCURRENCY)
+HTTP_RETRIES = 5             # retries on 429/5xx, honouring Retry-After
+HTTP_BACKOFF = 0.5           # exponential backoff factor between retries (seconds)
+CODIFY_BATCH_SIZE = 100      # assets per /codify/batch call when the API supports it (1 = disable)
 
 # Output - Windows compatible paths
 OUT_DIR = Path("codified_assets")
@@ -92,13 +125,44 @@ INCLUDE_PROVIDER = True
 INCLUDE_IMPORTS = True
 AUTO_TERRAFORM_FMT = True   # set True if terraform is installed
 OUT_IMPORT_CMDS = "import_commands.bat"  # Changed to .bat for Windows
+INTEGRATIONS_CACHE_TTL = 3600  # seconds to reuse OUT_DIR/.cache/integrations.json (0 = always refetch)
+LOGIN_CACHE_TTL = 3600       # seconds to reuse the cached access token (0 = always log in)
+# Per-user location for the token, outside OUT_DIR (which gets shared and committed)
+TOKEN_CACHE_PATH = Path(os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+                        or Path.home() / ".cache") / "firefly" / "azure_codify_token.json"
+CODIFY_CACHE_TTL = 24 * 3600  # seconds a cached /codify response stays reusable by --resume
+FORMAT_WORKERS = os.cpu_count() or 1  # processes for HCL formatting (1 = format inline)
+FORMAT_PARALLEL_MIN = 64     # only start worker processes for at least this many HCL blocks
 
 # =============== HTTP helpers ===============
+class _LoggingRetry(Retry):
+    """Retry that reports each attempt so throttling pauses show up in the progress output."""
+
+    def increment(self, method=None, url=None, response=None, error=None, *args, **kwargs):
+        new_retry = super().increment(method, url, response, error, *args, **kwargs)
+        reason = f"HTTP {response.status}" if response is not None else type(error).__name__
+        print(f"      ↻ retry {len(new_retry.history)}/{HTTP_RETRIES} {method} {url} ({reason})", file=sys.stderr, flush=True)
+        return new_retry
+
 def setup_session():
     """Setup requests session with Windows SSL handling"""
     session = requests.Session()
     session.headers.update({"Content-Type": "application/json"})
     
+    # Size the connection pool for the codify workers so they don't queue on sockets,
+    # and back off on throttling/transient server errors instead of failing the asset
+    retry = _LoggingRetry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST"],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    
     # Handle SSL certificate issues common in Windows corporate environments
     if not SSL_VERIFY:
         print("WARNING: SSL verification disabled. This is not recommended for production use.", file=sys.stderr)
@@ -125,6 +189,18 @@ SESSION = setup_session()
 class APIError(RuntimeError):
     pass
 
+def to_json(obj: Any) -> Any:
+    """Encode a request body, using orjson (bytes, no str round-trip) when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj)
+
+def parse_json(resp: requests.Response) -> Any:
+    """Decode a JSON response body, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(resp.content)
+    return resp.json()
+
 def _raise(resp: requests.Response) -> None:
     try:
         resp.raise_for_status()
@@ -145,15 +221,84 @@ def test_ssl_connection() -> bool:
         print(f"Connection Error: {e}", file=sys.stderr)
         return False
 
+def _token_cache_key(access_key: str) -> str:
+    return hashlib.sha256(access_key.encode("utf-8")).hexdigest()
+
+def _load_cached_token(access_key: str) -> Optional[str]:
+    """Return the token saved for this access key while it is fresher than LOGIN_CACHE_TTL."""
+    if LOGIN_CACHE_TTL <= 0:
+        return None
+    try:
+        cached = json.loads(TOKEN_CACHE_PATH.read_bytes())
+        if cached.get("key") == _token_cache_key(access_key) and time.time() - cached.get("ts", 0) < LOGIN_CACHE_TTL:
+            return cached.get("token") or None
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+def _save_cached_token(access_key: str, tok: str) -> None:
+    if LOGIN_CACHE_TTL <= 0:
+        return
+    try:
+        TOKEN_CACHE_PATH.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # Owner-only permissions: the file holds a bearer token (the mode only
+        # applies on creation, so tighten an existing file as well)
+        fd = os.open(TOKEN_CACHE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb", buffering=0) as f:
+            f.write(json.dumps({"ts": time.time(), "key": _token_cache_key(access_key), "token": tok}).encode("utf-8"))
+        os.chmod(TOKEN_CACHE_PATH, 0o600)
+    except OSError:
+        pass
+
+_login_lock = threading.Lock()
+_login_credentials: Optional[Tuple[str, str]] = None  # set while the session uses a cached token
+
+def _relogin_on_401(resp: requests.Response, *args: Any, **kwargs: Any) -> requests.Response:
+    """
+    Session response hook: when the API rejects a cached token, drop it, log in
+    again once and re-send the request (and any others that raced on the old token).
+    """
+    global _login_credentials
+    if resp.status_code != 401 or resp.request.url == f"{BASE_URL}/login":
+        return resp
+    with _login_lock:
+        if resp.request.headers.get("Authorization") == SESSION.headers.get("Authorization"):
+            if _login_credentials is None:
+                return resp  # a freshly issued token was rejected; report it
+            access_key, secret_key = _login_credentials
+            _login_credentials = None
+            print("    Cached access token rejected, logging in again…", file=sys.stderr)
+            try:
+                TOKEN_CACHE_PATH.unlink()
+            except OSError:
+                pass
+            _fresh_login(access_key, secret_key)
+    resp.close()
+    req = resp.request.copy()
+    req.headers["Authorization"] = SESSION.headers["Authorization"]
+    return SESSION.send(req, **kwargs)
+
+SESSION.hooks["response"].append(_relogin_on_401)
+
 def login(access_key: str, secret_key: str) -> str:
+    global _login_credentials
+    tok = _load_cached_token(access_key)
+    if tok:
+        SESSION.headers.update({"Authorization": f"Bearer {tok}"})
+        _login_credentials = (access_key, secret_key)
+        return tok
+    return _fresh_login(access_key, secret_key)
+
+def _fresh_login(access_key: str, secret_key: str) -> str:
     url = f"{BASE_URL}/login"
     try:
-        r = SESSION.post(url, data=json.dumps({"accessKey": access_key, "secretKey": secret_key}))
+        r = SESSION.post(url, data=to_json({"accessKey": access_key, "secretKey": secret_key}))
         _raise(r)
-        tok = r.json().get("accessToken")
+        tok = parse_json(r).get("accessToken")
         if not tok:
             raise APIError("Missing accessToken in login response")
         SESSION.headers.update({"Authorization": f"Bearer {tok}"})
+        _save_cached_token(access_key, tok)
         return tok
     except requests.exceptions.SSLError as e:
         print(f"SSL Certificate Error: {e}", file=sys.stderr)
@@ -165,21 +310,61 @@ def login(access_key: str, secret_key: str) -> str:
         raise APIError(f"SSL Certificate verification failed: {e}")
 
 # =============== Integrations (resolve subscription) ===============
+def _load_integrations(refresh: bool = False) -> List[Dict[str, Any]]:
+    """
+    List azurerm integrations, reusing the on-disk copy while it is fresher than
+    INTEGRATIONS_CACHE_TTL unless refresh is set. A failed fetch raises APIError.
+    """
+    cache_path = OUT_DIR / ".cache" / "integrations.json"
+    if INTEGRATIONS_CACHE_TTL > 0 and not refresh:
+        try:
+            cached = json.loads(cache_path.read_bytes())
+            if time.time() - cached.get("ts", 0) < INTEGRATIONS_CACHE_TTL:
+                return cached.get("items") or []
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    r = SESSION.get(f"{BASE_URL}/integrations/azurerm")
+    _raise(r)
+    items = parse_json(r) or []
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_bytes(json.dumps({"ts": time.time(), "items": items}).encode("utf-8"))
+    except OSError:
+        pass
+    return items
+
+@functools.lru_cache(maxsize=None)
+def _subscription_ids_by_name(refresh: bool = False) -> Dict[str, str]:
+    # Not cached when the fetch raises, so a failed GET is retried on the next lookup
+    ids: Dict[str, str] = {}
+    for it in _load_integrations(refresh):
+        sid = it.get("accountNumber") or it.get("providerId") or it.get("accountId")
+        if sid:
+            ids.setdefault(it.get("name"), sid)
+    return ids
+
 def resolve_subscription_id_by_name(name: str) -> str:
-    # Try a couple of endpoints that may exist in different deployments.
-    for url in (f"{BASE_URL}/integrations/azurerm",):
-        r = SESSION.get(url)
-        if r.status_code == 200:
-            items = r.json() or []
-            for it in items:
-                if it.get("name") == name:
-                    sid = it.get("accountNumber") or it.get("providerId") or it.get("accountId")
-                    if sid:
-                        return sid
+    sid = _subscription_ids_by_name().get(name)
+    if not sid:
+        # The cached list may predate this data source; refetch it once before giving up
+        _subscription_ids_by_name.cache_clear()
+        sid = _subscription_ids_by_name(refresh=True).get(name)
+    if sid:
+        return sid
     raise APIError(f"Data source '{name}' not found for provider 'azurerm'")
 
 # =============== Inventory ===============
-def inventory(provider_ids: List[str]) -> List[Dict[str, Any]]:
+@functools.lru_cache(maxsize=None)
+def _resource_group_pattern(rgs: Tuple[str, ...]) -> "re.Pattern[str]":
+    """Match '/resourcegroups/<rg>/' for any of the given (lowercased) group names."""
+    return re.compile("/resourcegroups/(?:" + "|".join(re.escape(rg) for rg in rgs) + ")/")
+
+def inventory_iter(provider_ids: List[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield matching inventory assets page by page (SIZE per page, following afterKey),
+    applying the client-side RG filter per page so only kept assets are held.
+    """
     url = f"{BASE_URL}/inventory"
     payload: Dict[str, Any] = {
         "size": SIZE,
@@ -195,78 +380,334 @@ def inventory(provider_ids: List[str]) -> List[Dict[str, Any]]:
     if RESOURCE_GROUPS:
         payload["resourceGroups"] = RESOURCE_GROUPS  # server-side if supported
 
-    r = SESSION.post(url, data=json.dumps(payload))
-    _raise(r)
-    body = r.json()
-    items = body.get("responseObjects", [])
-
     # client-side RG fallback in case server ignores key
+    in_rg = None
     if RESOURCE_GROUPS:
-        rgs = {rg.lower() for rg in RESOURCE_GROUPS}
+        # One regex scan per asset regardless of how many groups are configured
+        search = _resource_group_pattern(tuple(sorted({rg.lower() for rg in RESOURCE_GROUPS}))).search
         def in_rg(a: Dict[str, Any]) -> bool:
-            rid = (a.get("resourceId") or "").lower()
-            return any(f"/resourcegroups/{rg}/" in rid for rg in rgs)
-        items = [a for a in items if in_rg(a)]
-    return items
+            return search((a.get("resourceId") or "").lower()) is not None
+
+    while True:
+        r = SESSION.post(url, data=to_json(payload), stream=ijson is not None)
+        _raise(r)
+        size = int(r.headers.get("Content-Length") or INVENTORY_STREAM_MIN_BYTES)
+        if ijson is None or size < INVENTORY_STREAM_MIN_BYTES:
+            body = parse_json(r)
+            items = body.get("responseObjects") or []
+            yield from (filter(in_rg, items) if in_rg else items)
+            count, after_key = len(items), body.get("afterKey")
+        else:
+            # Drain the whole page before yielding: consumers pull at codify speed,
+            # and a half-read response would sit idle long enough to be dropped
+            page: Dict[str, Any] = {"count": 0, "afterKey": None}
+            items = _stream_inventory_page(r, page)
+            yield from list(filter(in_rg, items) if in_rg else items)
+            count, after_key = page["count"], page["afterKey"]
+
+        # A short page or a missing afterKey means this was the last page
+        if count < SIZE or not after_key:
+            break
+        payload["afterKey"] = after_key
+
+def _stream_inventory_page(resp: requests.Response, page: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Yield responseObjects from a streamed inventory response one at a time, so a
+    large page's raw body and parsed document are never held as a whole.
+    Stores the item count and afterKey in page.
+    """
+    resp.raw.decode_content = True
+    item = cursor = None
+    try:
+        for prefix, event, value in ijson.parse(resp.raw, use_float=True):
+            if prefix == "responseObjects.item" and event == "start_map":
+                item = ijson.ObjectBuilder()
+            if item is not None and prefix.startswith("responseObjects.item"):
+                item.event(event, value)
+                if prefix == "responseObjects.item" and event == "end_map":
+                    page["count"] += 1
+                    yield item.value
+                    item = None
+            elif prefix == "afterKey" or prefix.startswith("afterKey."):
+                cursor = cursor or ijson.ObjectBuilder()
+                cursor.event(event, value)
+    finally:
+        resp.close()
+    if cursor is not None:
+        page["afterKey"] = cursor.value
 
 # =============== Codify call (AWS-style) ===============
 def codify_one(req: Dict[str, Any]) -> Dict[str, Any]:
     url = f"{BASE_URL}/codify"
-    r = SESSION.post(url, data=json.dumps(req))
+    r = SESSION.post(url, data=to_json(req))
     _raise(r)
-    return r.json()
+    return parse_json(r)
+
+def _codify_cache_key(req: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(req, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def open_codify_cache() -> shelve.Shelf:
+    """Persistent store of codify responses under OUT_DIR/.cache, so a --resume run only codifies what is left."""
+    cache_dir = OUT_DIR / ".cache"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return shelve.open(str(cache_dir / "codify"))
+
+def codify_batch(reqs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Codify several assets in one call. Results are aligned with reqs by index;
+    each may carry its own "status"/"error" (see _batch_item_error).
+    """
+    url = f"{BASE_URL}/codify/batch"
+    r = SESSION.post(url, data=to_json(reqs))
+    _raise(r)
+    return _batch_results(parse_json(r), len(reqs))
+
+def _batch_results(body: Any, expected: int) -> List[Dict[str, Any]]:
+    """Check a /codify/batch body has the expected shape: {"results": [one object per request]}."""
+    results = body.get("results") if isinstance(body, dict) else None
+    if not isinstance(results, list) or not all(isinstance(item, dict) for item in results):
+        raise APIError(f"Unexpected batch codify response: {str(body)[:300]}")
+    if len(results) != expected:
+        raise APIError(f"Batch codify returned {len(results)} results for {expected} requests")
+    return results
+
+def _batch_item_error(item: Dict[str, Any]) -> Optional[str]:
+    status = item.get("status")
+    if status in (None, 200, "ok", "success") and not item.get("error"):
+        return None
+    return str(item.get("error") or item.get("message") or f"status {status}")
+
+_batch_codify_supported: Optional[bool] = None
+
+def batch_codify_supported() -> bool:
+    """
+    Probe /codify/batch once with an empty batch, so no asset is codified twice.
+    The probe is sent without the session's retry/backoff; any failure or an
+    unexpected response shape falls back to per-asset calls.
+    """
+    global _batch_codify_supported
+    if _batch_codify_supported is None:
+        try:
+            with requests.Session() as probe:
+                probe.headers.update(SESSION.headers)
+                probe.verify = SESSION.verify
+                probe.hooks["response"].append(_relogin_on_401)
+                r = probe.post(f"{BASE_URL}/codify/batch", data=to_json([]), timeout=30)
+            _raise(r)
+            _batch_results(parse_json(r), 0)
+            _batch_codify_supported = True
+        except (APIError, requests.RequestException, ValueError):
+            _batch_codify_supported = False
+    return _batch_codify_supported
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls at least 1/rate seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def prefetch(items: Iterable[Any], maxsize: int = INVENTORY_PREFETCH) -> Iterator[Any]:
+    """
+    Drain items in a background thread through a bounded queue, so the consumer
+    (e.g. codify) starts on the first page while later pages are still fetched.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    q: "queue.Queue[Any]" = queue.Queue(maxsize=maxsize)
+    end = object()
 
-def codify_assets(assets: List[Dict[str, Any]], sleep_sec: float = 0.02) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    def produce() -> None:
+        try:
+            for item in items:
+                q.put((None, item))
+        except BaseException as e:
+            q.put((e, None))
+        q.put((None, end))
+
+    threading.Thread(target=produce, name="inventory-prefetch", daemon=True).start()
+    while True:
+        err, item = q.get()
+        if err is not None:
+            raise err
+        if item is end:
+            return
+        yield item
+
+def codify_assets(assets: Iterable[Dict[str, Any]], max_workers: int = CONCURRENCY, max_rps: float = MAX_RPS,
+                  cache: Optional[shelve.Shelf] = None,
+                  resume: bool = False) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
     """
-    Codify all assets with detailed progress logging (per-item line + periodic ETA).
-    Returns list of (request, response) tuples for successes.
+    Codify all assets concurrently with detailed progress logging (per-item line + periodic ETA).
+    assets may be a lazy iterable (see prefetch); requests are submitted as they arrive and
+    progress shows "n/?" until the total is known.
+    Uses /codify/batch in chunks of CODIFY_BATCH_SIZE when available, else one call per asset.
+    With a cache (see open_codify_cache), new successes are stored; only with resume are cached
+    responses younger than CODIFY_CACHE_TTL reused, since the key doesn't change with the asset's config.
+    Returns list of (request, response) tuples for successes, in input order.
     """
-    total = len(assets)
+    seen: List[Dict[str, Any]] = []
+    total: Optional[int] = len(assets) if isinstance(assets, (list, tuple)) else None
     ok = 0
     fail = 0
-    out: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    done = 0
+    last_progress = 0
+    results: Dict[int, Dict[str, Any]] = {}
     t0 = time.time()
+    limiter = RateLimiter(max_rps)
+
+    def report_progress() -> None:
+        nonlocal last_progress
+        last_progress = done
+        elapsed = time.time() - t0
+        rate = done / elapsed if elapsed > 0 else 0.0
+        if total is None:
+            print(f"    — progress: {done}/? | ok={ok} fail={fail} | {rate:.1f}/s", flush=True)
+            return
+        remaining = total - done
+        eta = remaining / rate if rate > 0 else 0.0
+        print(f"    — progress: {done}/{total} | ok={ok} fail={fail} | {rate:.1f}/s | ETA ~{eta:.0f}s", flush=True)
+
+    def report_item(idx: int, status: str) -> None:
+        nonlocal done
+        req = seen[idx]
+        done += 1
+        print(f"    [{done}/{total if total is not None else '?'}] {req.get('assetType', '?')} → {(req.get('assetId') or '')[:150]}", flush=True)
+        print(f"      {status}", flush=True)
+        if done % 25 == 0 or done == total:
+            report_progress()
+
+    use_batch: Optional[bool] = None
+
+    def run_unit(idxs: List[int]) -> Tuple[List[Dict[str, Any]], float]:
+        limiter.wait()
+        t_call = time.time()
+        if use_batch:
+            resps = codify_batch([seen[i] for i in idxs])
+        else:
+            resps = [codify_one(seen[idxs[0]])]
+        return resps, time.time() - t_call
 
-    for idx, req in enumerate(assets, start=1):
-        at = req.get("assetType", "?")
-        aid = (req.get("assetId") or "")[:150]
-        print(f"    [{idx}/{total}] {at} → {aid}", flush=True)
-
-        missing = [k for k in ("assetType", "assetId", "iacType", "provider", "accountNumber") if not req.get(k)]
-        if missing:
-            print(f"      ✗ skip (missing {missing})", flush=True)
-            fail += 1
-            continue
-
+    def handle(fut: Any, idxs: List[int]) -> None:
+        nonlocal ok, fail
         try:
-            t_call = time.time()
-            resp = codify_one(req)
-            dt = time.time() - t_call
-            out.append((req, resp))
-            ok += 1
-            print(f"      ✓ ok ({dt:.2f}s)", flush=True)
+            resps, dt = fut.result()
         except APIError as e:
-            fail += 1
             msg = str(e)
             if len(msg) > 300:
                 msg = msg[:300] + "…"
-            print(f"      ✗ failed: {msg}", flush=True)
-
-        if sleep_sec > 0:
-            time.sleep(sleep_sec)
-
-        if idx % 25 == 0 or idx == total:
-            elapsed = time.time() - t0
-            rate = idx / elapsed if elapsed > 0 else 0.0
-            remaining = total - idx
-            eta = remaining / rate if rate > 0 else 0.0
-            print(f"    — progress: {idx}/{total} | ok={ok} fail={fail} | {rate:.1f}/s | ETA ~{eta:.0f}s", flush=True)
-
+            for idx in idxs:
+                fail += 1
+                report_item(idx, f"✗ failed: {msg}")
+            return
+
+        for idx, resp in zip(idxs, resps):
+            err = _batch_item_error(resp) if use_batch else None
+            if err:
+                fail += 1
+                report_item(idx, f"✗ failed: {err[:300]}")
+            else:
+                results[idx] = resp
+                ok += 1
+                if cache is not None:
+                    cache[_codify_cache_key(seen[idx])] = {"ts": time.time(), "resp": resp}
+                report_item(idx, f"✓ ok ({dt:.2f}s)")
+
+    # Workers signal completion through this queue; results are handled on this
+    # thread only, which keeps progress counters and the cache single-threaded.
+    completed: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+    submitted = 0
+    handled = 0
+    unit: List[int] = []
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as ex:
+        def submit() -> None:
+            nonlocal submitted
+            idxs = list(unit)
+            unit.clear()
+            ex.submit(run_unit, idxs).add_done_callback(lambda fut: completed.put((fut, idxs)))
+            submitted += 1
+
+        for idx, req in enumerate(assets):
+            seen.append(req)
+            missing = [k for k in ("assetType", "assetId", "iacType", "provider", "accountNumber") if not req.get(k)]
+            hit = cache.get(_codify_cache_key(req)) if cache is not None and resume and not missing else None
+            if missing:
+                fail += 1
+                report_item(idx, f"✗ skip (missing {missing})")
+            elif hit and time.time() - hit["ts"] < CODIFY_CACHE_TTL:
+                results[idx] = hit["resp"]
+                ok += 1
+                report_item(idx, "✓ ok (cached)")
+            else:
+                if use_batch is None:
+                    use_batch = CODIFY_BATCH_SIZE > 1 and batch_codify_supported()
+                unit.append(idx)
+                if len(unit) >= (CODIFY_BATCH_SIZE if use_batch else 1):
+                    submit()
+
+            # Report whatever finished while the next request was being produced
+            while not completed.empty():
+                handle(*completed.get())
+                handled += 1
+
+        if unit:
+            submit()
+        total = len(seen)
+        while handled < submitted:
+            handle(*completed.get())
+            handled += 1
+
+    if last_progress != done:
+        report_progress()
     elapsed = time.time() - t0
     print(f"    Done codifying: ok={ok}, fail={fail}, total={total}, elapsed={elapsed:.1f}s", flush=True)
-    return out
+    return [(seen[idx], results[idx]) for idx in sorted(results)]
 
 # =============== Formatting + output (AWS-style) ===============
+# Patterns used by the formatter, compiled once at import time.
+_RE_COMPLEX_STRING = re.compile(r'(\w+\s*=\s*)"([^"]*(?:\\r\\n|\\n|Import-Module)[^"]*)"', re.DOTALL)
+_RE_LONG_STRING = re.compile(r'(\w+\s*=\s*)"([^"]{200,}|[^"]*(?:Import-Module|PowerShell|$array|foreach|Server=tcp|Driver={)[^"]*)"', re.DOTALL)
+# Content that forces a heredoc, and the markers _RE_LONG_STRING looks for
+_HEREDOC_MARKERS = ('<!--', '<policies>', 'Server=tcp:', 'Driver={', 'ODBC Driver', 'Import-Module', '$array', 'foreach(')
+_LONG_STRING_MARKERS = ('Import-Module', 'PowerShell', 'foreach', 'Server=tcp', 'Driver={')
+_RE_IMPORT_MODULE_QUOTES = re.compile(r'Import-Module\s+"([^"]*)"([^"]*)"([^"]*)"')
+_RE_JSON_KEY = re.compile(r'"([^"]+)"\s*:')
+_RE_UNQUOTED_KEY = re.compile(r'(?<!")\b([A-Za-z0-9_]+)\b\s*:')
+_RE_HTTPS_EQ = re.compile(r'https\s*=\s*//')
+_RE_SERVER_TCP_EQ = re.compile(r'Server=tcp\s*=\s*')
+_RE_BARE_PROVIDER = re.compile(r'\bprovider\s*\n\s*{')
+_RE_PROVIDER_MERGED = re.compile(r'\}provider\s+"([^"]+)"\s*{')
+_RE_PROVIDER_STRAY = re.compile(r'\}\s*provider\s*{')
+_RE_OPEN_BRACE = re.compile(r'\{\s*')
+_RE_CLOSE_BRACE = re.compile(r'\s*\}')
+_RE_BREAK_AFTER_ASSIGN = re.compile(r'(=\s*(?:"[^"]*(?:\\r\\n|\\n)[^"]*"|"[^"]*"|[^"\s{][^{]*?))\s+([a-zA-Z_"]\w*(?:\s*=|\s*{))')
+_RE_BREAK_AFTER_VALUE = re.compile(r'((?:true|false|\d+|"[^"]*"|\]|\)))\s+([a-zA-Z_"]\w*\s*[={])')
+_RE_BREAK_AFTER_LIST = re.compile(r'(\])\s+([a-zA-Z_"]\w*\s*[={])')
+_RE_BREAK_WIDE_GAP = re.compile(r'([^{\n"])\s{2,}([a-zA-Z_"][^=]*=)')
+_RE_EQUALS = re.compile(r'\s*=\s*')
+_RE_DOUBLE_EQUALS = re.compile(r'\s*=\s*=\s*')
+_RE_BLANK_LINES = re.compile(r'\n\s*\n')
+_RE_MULTI_SPACE = re.compile(r' {2,}')
+_RE_DUP_ID = re.compile(r'(\bid\s*=\s*)\n\s*(\bid\s*=\s*[^\n]+)')
+_RE_DUP_EMPTY_ID = re.compile(r'(\bid\s*=\s*)\n\s*(\bid\s*=\s*)')
+_RE_HEREDOC_MARKER = re.compile(r'<<(\w+)')
+_RE_BLOCK_HEADER = re.compile(r'^(\s*)(resource|data)\s+(".*?")\s+(".*?")\s*{', re.MULTILINE)
+_RE_RESOURCE_NAME = re.compile(r'resource\s+"[^"]+"\s+"([^"]+)"')
+_RE_IMPORT_TO = re.compile(r'(to\s*=\s*[^.]*\.)[^"\s]+')
+_RE_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9_]+")
+_RE_DUP_SUFFIX = re.compile(r"_\d+\Z")
+
 def _strip_headers(hcl: str) -> str:
     out: List[str] = []
     for ln in hcl.splitlines():
@@ -282,94 +723,61 @@ def fix_multiline_strings(hcl: str) -> str:
     """
     # First, handle strings that contain \r\n sequences and should be heredocs
     def fix_complex_strings(text):
-        # Pattern to match strings with \r\n sequences OR very long content
-        pattern = r'(\w+\s*=\s*)"([^"]*(?:\\r\\n|\\n|Import-Module)[^"]*)"'
-        
         def replacement(match):
             key = match.group(1).strip()
             content = match.group(2)
             
             # Use heredoc for complex patterns, very long strings, or specific markers
-            if (any(marker in content for marker in ['<!--', '<policies>', 'Server=tcp:', 'Driver={', 'ODBC Driver', 'Import-Module', '$array', 'foreach('])
+            if (any(marker in content for marker in _HEREDOC_MARKERS)
                 or len(content) > 100 or content.count('\\r\\n') > 1):
                 clean_content = content.replace('\\r\\n', '\n').replace('\\n', '\n').replace('\\t', '  ')
                 return f'{key} = <<EOF\n{clean_content}\nEOF'
             else:
                 return match.group(0)  # Keep as is for simple strings
         
-        return re.sub(pattern, replacement, text, flags=re.DOTALL)
+        return _RE_COMPLEX_STRING.sub(replacement, text)
     
-    # Apply the fix
-    result = fix_complex_strings(hcl)
+    # Apply the fix (only strings with escaped newlines or Import-Module can match)
+    result = fix_complex_strings(hcl) if ('\\n' in hcl or 'Import-Module' in hcl) else hcl
     
-    # Handle strings that are broken across lines due to our formatting
+    # Handle strings that are broken across lines due to our formatting.
+    # Single forward pass: next_quote[k] is the first line at or after k that
+    # contains a quote, so finding a closing quote never rescans lines.
     lines = result.split('\n')
+    n = len(lines)
+    next_quote = [n] * (n + 1)
+    for k in range(n - 1, -1, -1):
+        next_quote[k] = k if '"' in lines[k] else next_quote[k + 1]
+
     final_lines = []
     i = 0
     
-    while i < len(lines):
+    while i < n:
         line = lines[i]
         
-        # Check if this line contains an opening quote without a closing quote
-        if '=' in line and '"' in line and not line.strip().startswith('EOF'):
-            # Count quotes in the line
-            quote_count = line.count('"')
-            
-            # If odd number of quotes, this might be start of a multi-line string
-            if quote_count % 2 == 1:
-                # Look for the closing quote in subsequent lines
-                full_content = line
-                j = i + 1
-                found_closing = False
+        # An odd number of quotes on an assignment line starts a multi-line string
+        if '=' in line and '"' in line and line.count('"') % 2 == 1 and not line.strip().startswith('EOF'):
+            # Closing quote must be within the next 19 lines
+            j = next_quote[i + 1]
+            quote_pos = line.find('"', line.find('='))
+            if j < min(n, i + 20) and quote_pos != -1:
+                key_part = line[:quote_pos].strip()
+                
+                # Content between the quotes across all lines; inner lines are stripped
+                content_parts = [line[quote_pos + 1:]]
+                content_parts.extend(ln.strip() for ln in lines[i + 1:j])
+                content_parts.append(lines[j][:lines[j].rfind('"')])
+                full_content_str = '\n'.join(content_parts)
                 
-                # Look ahead for closing quote (max 20 lines)
-                while j < len(lines) and j < i + 20:
-                    next_line = lines[j]
-                    full_content += '\n' + next_line
-                    if '"' in next_line:
-                        found_closing = True
-                        break
-                    j += 1
+                # The joined content always spans lines, so it always becomes a heredoc
+                clean_content = full_content_str.replace('\\r\\n', '\n').replace('\\n', '\n').replace('\\t', '  ')
+                final_lines.append(f'{key_part} = <<EOF')
+                final_lines.append(clean_content)
+                final_lines.append('EOF')
                 
-                if found_closing:
-                    # Extract key and content
-                    eq_pos = line.find('=')
-                    quote_pos = line.find('"', eq_pos)
-                    if eq_pos != -1 and quote_pos != -1:
-                        key_part = line[:quote_pos].strip()
-                        
-                        # Get content between quotes across all lines
-                        content_start = line[quote_pos + 1:]
-                        content_parts = [content_start]
-                        
-                        for k in range(i + 1, j + 1):
-                            if k == j:  # Last line with closing quote
-                                close_quote_pos = lines[k].rfind('"')
-                                if close_quote_pos != -1:
-                                    content_parts.append(lines[k][:close_quote_pos])
-                                else:
-                                    content_parts.append(lines[k])
-                            else:
-                                content_parts.append(lines[k].strip())
-                        
-                        full_content_str = '\n'.join(content_parts)
-                        
-                        # Always use heredoc for anything with special markers or that's multiline
-                        if (any(marker in full_content_str for marker in ['<!--', '<policies>', 'Server=tcp:', 'Driver={', 'ODBC Driver', 'Import-Module', '$array', 'foreach('])
-                            or len(full_content_str) > 100 or '\n' in full_content_str):
-                            # Use heredoc
-                            clean_content = full_content_str.replace('\\r\\n', '\n').replace('\\n', '\n').replace('\\t', '  ')
-                            final_lines.append(f'{key_part} = <<EOF')
-                            final_lines.append(clean_content)
-                            final_lines.append('EOF')
-                        else:
-                            # Escape and keep as single line
-                            escaped_content = full_content_str.replace('\n', '\\n').replace('\r', '')
-                            final_lines.append(f'{key_part} = "{escaped_content}"')
-                        
-                        # Skip processed lines
-                        i = j + 1
-                        continue
+                # Skip processed lines
+                i = j + 1
+                continue
         
         # If we reach here, it's a normal line
         final_lines.append(line)
@@ -377,66 +785,55 @@ def fix_multiline_strings(hcl: str) -> str:
     
     return '\n'.join(final_lines)
 
-def fix_duplicate_id_lines_in_file(file_path: Path) -> None:
-    """
-    Fix duplicate id = lines in a Terraform file.
-    This is a post-processing step that runs after the file is written.
-    """
-    try:
-        content = file_path.read_text(encoding="utf-8")
-        
-        # Check if the file has duplicate id = lines
-        if "id = \n  id =" in content:
-            # Use regex to fix the duplicate lines
-            fixed_content = re.sub(r'(\bid\s*=\s*)\n\s*(\bid\s*=\s*[^\n]+)', r'\2', content)
-            
-            # Write the fixed content back
-            file_path.write_text(fixed_content, encoding="utf-8")
-    except Exception as e:
-        print(f"    Error fixing {file_path.name}: {e}", file=sys.stderr)
-
-def pretty_hcl(hcl: str) -> str:
+def pretty_hcl(hcl: str, layout: bool = True) -> str:
     """
     Format HCL code with proper Terraform indentation and structure.
+    With layout=False only the rewrites that make the HCL valid are applied and the
+    indentation/header pass is left to `terraform fmt`.
     """
     hcl = _strip_headers(hcl).strip()
     
     # First, fix multi-line strings
     hcl = fix_multiline_strings(hcl)
 
+    # Passes for rare constructs are guarded by a substring check so that
+    # typical blocks aren't copied once per pass for nothing.
+
     # Handle problematic quotes in strings that break parsing
     # Fix nested quotes that appear in PowerShell content
-    hcl = re.sub(r'Import-Module\s+"([^"]*)"([^"]*)"([^"]*)"', r'Import-Module \1\2\3', hcl)
+    if 'Import-Module' in hcl:
+        hcl = _RE_IMPORT_MODULE_QUOTES.sub(r'Import-Module \1\2\3', hcl)
     
-    # Convert JSON-style keys:  "Key": -> "Key" =
-    hcl = re.sub(r'"([^"]+)"\s*:', r'"\1" =', hcl)
-    # Also handle unquoted keys with a colon:  key: -> key =
-    hcl = re.sub(r'(?<!")\b([A-Za-z0-9_]+)\b\s*:', r'\1 =', hcl)
+    if ':' in hcl:
+        # Convert JSON-style keys:  "Key": -> "Key" =
+        hcl = _RE_JSON_KEY.sub(r'"\1" =', hcl)
+        # Also handle unquoted keys with a colon:  key: -> key =
+        hcl = _RE_UNQUOTED_KEY.sub(r'\1 =', hcl)
 
     # Fix malformed URLs (https =// should be https://)
-    hcl = re.sub(r'https\s*=\s*//', 'https://', hcl)
-    hcl = re.sub(r'Server=tcp\s*=\s*', 'Server=tcp:', hcl)
-
-    # Fix the provider block issue first
-    hcl = re.sub(r'\bprovider\s*\n\s*{', 'provider "azurerm" {', hcl)
-    hcl = re.sub(r'\}provider\s+"([^"]+)"\s*{', r'}\n\nprovider "\1" {', hcl)  # Fix merged provider blocks
-    
-    # Fix any stray provider blocks
-    hcl = re.sub(r'\}\s*provider\s*{', '}\n\nprovider "azurerm" {', hcl)
+    if 'https' in hcl:
+        hcl = _RE_HTTPS_EQ.sub('https://', hcl)
+    if 'Server=tcp' in hcl:
+        hcl = _RE_SERVER_TCP_EQ.sub('Server=tcp:', hcl)
+
+    if 'provider' in hcl:
+        # Fix the provider block issue first
+        hcl = _RE_BARE_PROVIDER.sub('provider "azurerm" {', hcl)
+        hcl = _RE_PROVIDER_MERGED.sub(r'}\n\nprovider "\1" {', hcl)  # Fix merged provider blocks
+        
+        # Fix any stray provider blocks
+        hcl = _RE_PROVIDER_STRAY.sub('}\n\nprovider "azurerm" {', hcl)
     
     # AGGRESSIVE LINE BREAKING for single-line HCL
     # Step 1: Break after opening braces
-    hcl = re.sub(r'\{\s*', '{\n', hcl)
+    hcl = _RE_OPEN_BRACE.sub('{\n', hcl)
     
     # Step 2: Break before closing braces
-    hcl = re.sub(r'\s*\}', '\n}', hcl)
+    hcl = _RE_CLOSE_BRACE.sub('\n}', hcl)
     
     # Step 3: Handle very long quoted strings that should be heredocs BEFORE other processing
     # Look for extremely long strings that are likely to be code/scripts
     def handle_long_strings(text):
-        # More aggressive pattern - catch any string longer than 200 chars OR with specific markers
-        pattern = r'(\w+\s*=\s*)"([^"]{200,}|[^"]*(?:Import-Module|PowerShell|$array|foreach|Server=tcp|Driver={)[^"]*)"'
-        
         def replacement(match):
             key = match.group(1).strip()
             content = match.group(2)
@@ -445,52 +842,58 @@ def pretty_hcl(hcl: str) -> str:
             clean_content = content.replace('\\r\\n', '\n').replace('\\n', '\n').replace('\\t', '  ')
             return f'{key} = <<EOF\n{clean_content}\nEOF'
         
-        return re.sub(pattern, replacement, text, flags=re.DOTALL)
+        return _RE_LONG_STRING.sub(replacement, text)
     
-    hcl = handle_long_strings(hcl)
+    # Small blocks without script/connection-string markers have no string it could rewrite
+    if len(hcl) > 200 or any(marker in hcl for marker in _LONG_STRING_MARKERS):
+        hcl = handle_long_strings(hcl)
     
     # Step 4: Break after key-value assignments when followed by another key
     # BUT preserve quoted strings with special content
     # Look for pattern: value  key = or value  "key" = or value  key {
     # but not if we're inside a complex quoted string
-    hcl = re.sub(r'(=\s*(?:"[^"]*(?:\\r\\n|\\n)[^"]*"|"[^"]*"|[^"\s{][^{]*?))\s+([a-zA-Z_"]\w*(?:\s*=|\s*{))', r'\1\n\2', hcl)
+    hcl = _RE_BREAK_AFTER_ASSIGN.sub(r'\1\n\2', hcl)
     
     # Step 5: Break after closing values when followed by keys
-    hcl = re.sub(r'((?:true|false|\d+|"[^"]*"|\]|\)))\s+([a-zA-Z_"]\w*\s*[={])', r'\1\n\2', hcl)
+    hcl = _RE_BREAK_AFTER_VALUE.sub(r'\1\n\2', hcl)
     
     # Step 6: Break after closing arrays/objects when followed by keys
-    hcl = re.sub(r'(\])\s+([a-zA-Z_"]\w*\s*[={])', r'\1\n\2', hcl)
+    hcl = _RE_BREAK_AFTER_LIST.sub(r'\1\n\2', hcl)
     
     # Step 7: Break inside blocks when there are multiple properties
     # This handles cases like: key1 = "value"  key2 = "value"
     # But avoid breaking inside complex quoted strings AND avoid breaking import blocks
     # Modified to exclude import blocks from this aggressive line breaking
-    hcl = re.sub(r'([^{\n"])\s{2,}([a-zA-Z_"][^=]*=)', r'\1\n\2', hcl)
+    hcl = _RE_BREAK_WIDE_GAP.sub(r'\1\n\2', hcl)
     
     # Step 7: Ensure spacing around equals signs
-    hcl = re.sub(r'\s*=\s*', ' = ', hcl)
+    hcl = _RE_EQUALS.sub(' = ', hcl)
     
     # Step 8: Fix double equals that might have been created
-    hcl = re.sub(r'\s*=\s*=\s*', ' = ', hcl)
+    if ' =  = ' in hcl:
+        hcl = _RE_DOUBLE_EQUALS.sub(' = ', hcl)
     
     # Step 9: Clean up multiple newlines and spaces
-    hcl = re.sub(r'\n\s*\n', '\n', hcl)
-    hcl = re.sub(r' {2,}', ' ', hcl)
+    hcl = _RE_BLANK_LINES.sub('\n', hcl)
+    hcl = _RE_MULTI_SPACE.sub(' ', hcl)
     
     # Step 10: Fix duplicate id = lines in import blocks - FINAL FIX
     # This is the key fix for the reported issue - apply at the very end
     # Use a comprehensive approach to handle all variations
     
-    # First, handle the most common case: empty id = followed by id = with value
-    hcl = re.sub(r'(\bid\s*=\s*)\n\s*(\bid\s*=\s*[^\n]+)', r'\2', hcl)
-    
-    # Then handle any remaining cases where id = is followed by another id = on the next line
-    hcl = re.sub(r'(\bid\s*=\s*)\n\s*(\bid\s*=\s*)', r'\1', hcl)
-    
-    # Final cleanup: ensure proper spacing after id = in import blocks
-    hcl = re.sub(r'(\bid\s*=\s*)([^"\s])', r'\1\2', hcl)
+    if 'id' in hcl:
+        # First, handle the most common case: empty id = followed by id = with value
+        hcl = _RE_DUP_ID.sub(r'\2', hcl)
+        
+        # Then handle any remaining cases where id = is followed by another id = on the next line
+        hcl = _RE_DUP_EMPTY_ID.sub(r'\1', hcl)
     
-    # Now apply proper indentation
+    if not layout:
+        return hcl.strip() + '\n'
+    return _layout_hcl(hcl)
+
+def _layout_hcl(hcl: str) -> str:
+    """The indentation/header pass of pretty_hcl, over HCL already broken into lines."""
     lines = hcl.split('\n')
     formatted_lines = []
     indent_level = 0
@@ -505,7 +908,7 @@ def pretty_hcl(hcl: str) -> str:
             
         # Handle heredoc
         if not in_heredoc and '<<' in stripped:
-            marker_match = re.search(r'<<(\w+)', stripped)
+            marker_match = _RE_HEREDOC_MARKER.search(stripped)
             if marker_match:
                 heredoc_marker = marker_match.group(1)
                 in_heredoc = True
@@ -538,89 +941,88 @@ def pretty_hcl(hcl: str) -> str:
     result = '\n'.join(formatted_lines)
     
     # Ensure resource/data blocks are properly formatted
-    result = re.sub(
-        r'^(\s*)(resource|data)\s+(".*?")\s+(".*?")\s*{',
-        r'\1\2 \3 \4 {',
-        result,
-        flags=re.MULTILINE
-    )
-    
-    # Note: Duplicate id = lines will be fixed in post-processing
+    if 'resource' in result or 'data' in result:
+        result = _RE_BLOCK_HEADER.sub(r'\1\2 \3 \4 {', result)
     
     return result.strip() + '\n'
 
-def format_block_content(lines: List[str]) -> List[str]:
-    """Format content within a block (like tags, app_settings, etc.)"""
-    if len(lines) < 2:
-        return lines
-    
-    # Get the base indentation from the first line
-    first_line = lines[0]
-    base_indent = len(first_line) - len(first_line.lstrip())
-    
-    result = [first_line]  # Opening line
-    
-    # Process middle lines (the content)
-    for line in lines[1:-1]:
-        stripped = line.strip()
-        if stripped:
-            # Add proper indentation for content
-            result.append(" " * (base_indent + 2) + stripped)
-        else:
-            result.append("")
-    
-    # Add closing line
-    if lines[-1].strip() == '}':
-        result.append(" " * base_indent + "}")
-    else:
-        result.append(lines[-1])
-    
-    return result
+class FormattedHCL(NamedTuple):
+    """pretty_hcl output plus the block's resource name and where it sits in the text."""
+    text: str
+    resource_name: str
+    kind: str  # "resource", "import" or "" when no name was found
+    name_span: Tuple[int, int]
+
+    def renamed(self, new_name: str) -> str:
+        """Return the text with the resource name token replaced."""
+        start, end = self.name_span
+        return self.text[:start] + new_name + self.text[end:]
 
-def extract_resource_name(hcl_content: str) -> str:
+def pretty_hcl_with_meta(hcl: str, layout: bool = True) -> FormattedHCL:
     """
-    Extract the resource name from HCL content.
-    Looks for patterns like: resource "azurerm_virtual_machine_extension" "mdewindows"
-    or import blocks like: to = azurerm_virtual_machine_extension.mdewindows
-    Returns the resource name (e.g., "mdewindows") or empty string if not found.
+    Format HCL and locate its resource name, e.g. "mdewindows" in
+    resource "azurerm_virtual_machine_extension" "mdewindows"
+    or in an import block's: to = azurerm_virtual_machine_extension.mdewindows
     """
-    # Pattern to match resource definitions
-    resource_pattern = r'resource\s+"[^"]+"\s+"([^"]+)"'
-    match = re.search(resource_pattern, hcl_content)
+    text = pretty_hcl(hcl, layout)
+    match = _RE_RESOURCE_NAME.search(text)
     if match:
-        return match.group(1)
-    
-    # Pattern to match import blocks
-    import_pattern = r'to\s*=\s*[^.]*\.([^"]+)'
-    match = re.search(import_pattern, hcl_content)
+        return FormattedHCL(text, match.group(1), "resource", match.span(1))
+    match = _RE_IMPORT_TO.search(text)
     if match:
-        return match.group(1)
-    
-    return ""
+        return FormattedHCL(text, text[match.end(1):match.end()], "import", (match.end(1), match.end()))
+    return FormattedHCL(text, "", "", (0, 0))
 
-def make_unique_resource_name(hcl_content: str, existing_names: set, base_name: str) -> tuple[str, str]:
+def make_unique_resource_name(formatted: FormattedHCL, existing_names: set,
+                              next_suffix: Dict[str, int]) -> tuple[str, str]:
     """
     Make a resource name unique by adding a counter if needed.
+    next_suffix remembers the next counter to try per base name, so repeated
+    duplicates don't re-probe base_name_1, base_name_2, ... each time.
     Returns (unique_name, modified_hcl_content)
     """
+    base_name = formatted.resource_name
     if base_name not in existing_names:
         existing_names.add(base_name)
-        return base_name, hcl_content
+        return base_name, formatted.text
     
-    # Find a unique name by adding a counter
-    counter = 1
-    while True:
-        unique_name = f"{base_name}_{counter}"
-        if unique_name not in existing_names:
-            existing_names.add(unique_name)
-            # Replace the resource name in the HCL content
-            modified_hcl = re.sub(
-                r'(resource\s+"[^"]+"\s+")[^"]+(")',
-                rf'\1{unique_name}\2',
-                hcl_content
-            )
-            return unique_name, modified_hcl
+    # Resume from the last counter used for this base name
+    counter = next_suffix.get(base_name, 1)
+    while f"{base_name}_{counter}" in existing_names:
         counter += 1
+    unique_name = f"{base_name}_{counter}"
+    next_suffix[base_name] = counter + 1
+    existing_names.add(unique_name)
+    return unique_name, formatted.renamed(unique_name)
+
+def format_all(texts: List[str], layout: bool = True) -> List[FormattedHCL]:
+    """
+    pretty_hcl_with_meta over many blocks, in input order. Large batches are
+    spread over FORMAT_WORKERS processes since formatting is CPU-bound.
+    """
+    fmt = functools.partial(pretty_hcl_with_meta, layout=layout)
+    if FORMAT_WORKERS > 1 and len(texts) >= FORMAT_PARALLEL_MIN:
+        try:
+            with ProcessPoolExecutor(max_workers=FORMAT_WORKERS) as ex:
+                return list(ex.map(fmt, texts, chunksize=32))
+        except Exception as e:
+            print(f"    Parallel formatting unavailable ({e}); formatting inline", file=sys.stderr)
+    return list(map(fmt, texts))
+
+def run_terraform_fmt(terraform: str, out_dir: Path) -> bool:
+    """Run `terraform fmt` once over all generated files; returns False (with a warning) if it fails."""
+    try:
+        # The resolved path works on Windows without a shell
+        result = subprocess.run([terraform, "fmt", "-recursive", str(out_dir)],
+                                capture_output=True, text=True, check=False)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"WARNING: terraform fmt could not run: {e}", file=sys.stderr)
+        return False
+    if result.returncode != 0:
+        detail = (result.stderr or result.stdout).strip()
+        print(f"WARNING: terraform fmt failed (exit {result.returncode}): {detail[:500]}", file=sys.stderr)
+        return False
+    return True
 
 def write_outputs(items: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]) -> None:
     """
@@ -631,150 +1033,164 @@ def write_outputs(items: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Non
     out_dir = OUT_DIR
     out_dir.mkdir(parents=True, exist_ok=True)
 
+    # When terraform fmt will run over the output it re-indents everything anyway,
+    # so pretty_hcl can skip its own layout pass (and apply it afterwards if fmt fails)
+    terraform = shutil.which("terraform") if AUTO_TERRAFORM_FMT else None
+    layout = terraform is None
+
     per_type: Dict[str, List[str]] = {}
-    provider_written = False
+    provider_block: Optional[str] = None
     import_cmds_path = out_dir / OUT_IMPORT_CMDS
     
+    # Windows batch file header; commands are collected and written once at the end
+    cmd_lines: List[str] = [
+        "@echo off",
+        "REM Terraform import commands for Azure resources",
+        "REM Generated by firefly_bulk_codify_azure_windows.py",
+        "",
+    ]
+    
     # Track resource names per asset type to avoid duplicates
     resource_names_per_type: Dict[str, set] = {}
     # Track the mapping of original names to unique names
     name_mapping_per_type: Dict[str, Dict[str, str]] = {}
-
-    # Windows batch file header
-    with import_cmds_path.open("w", encoding="utf-8") as bat:
-        bat.write("@echo off\n")
-        bat.write("REM Terraform import commands for Azure resources\n")
-        bat.write("REM Generated by firefly_bulk_codify_azure_windows.py\n\n")
+    # Next rename counter per base name, per asset type
+    name_counters_per_type: Dict[str, Dict[str, int]] = {}
+
+    # Format every distinct resource/import block up front (across processes for
+    # large batches); the loop below only renames and collects
+    items = list(items)
+    blocks = [resp.get("codifiedResult") or "" for _, resp in items]
+    if INCLUDE_IMPORTS:
+        blocks += [resp.get("importBlocks") or "" for _, resp in items]
+    distinct = list(dict.fromkeys(b for b in blocks if b))
+    formatted = dict(zip(distinct, format_all(distinct, layout)))
+
+    # Local bindings for the per-asset loop
+    err = sys.stderr
+    add_cmd = cmd_lines.append
+
+    for req, resp in items:
+        asset_type = (req.get("assetType") or "misc").strip()
+        buf = per_type.setdefault(asset_type, [])
         
-        for req, resp in items:
-            asset_type = (req.get("assetType") or "misc").strip()
-            buf = per_type.setdefault(asset_type, [])
-            
-            # Initialize resource names set for this asset type if not exists
-            if asset_type not in resource_names_per_type:
-                resource_names_per_type[asset_type] = set()
-                name_mapping_per_type[asset_type] = {}
-
-            # provider block (once)
-            if INCLUDE_PROVIDER and not provider_written:
-                pb = resp.get("providerBlock")
-                if pb:
-                    # Clean up the provider block before writing
-                    cleaned_pb = pb.strip()
+        # Initialize resource names set for this asset type if not exists
+        if asset_type not in resource_names_per_type:
+            resource_names_per_type[asset_type] = set()
+            name_mapping_per_type[asset_type] = {}
+            name_counters_per_type[asset_type] = {}
+
+        # provider block: keep the first non-empty one, formatted after the loop
+        if INCLUDE_PROVIDER and provider_block is None:
+            provider_block = resp.get("providerBlock") or None
+
+        # resource HCL
+        cr = resp.get("codifiedResult") or ""
+        unique_resource_name = None
+        if cr:
+            # Check for duplicate resource names and make them unique
+            formatted_cr = formatted[cr]
+            resource_name = formatted_cr.resource_name
+            if resource_name:
+                unique_resource_name, modified_cr = make_unique_resource_name(
+                    formatted_cr, 
+                    resource_names_per_type[asset_type], 
+                    name_counters_per_type[asset_type]
+                )
+                # Store the mapping for use with import blocks
+                name_mapping_per_type[asset_type][resource_name] = unique_resource_name
+                if unique_resource_name != resource_name:
+                    print(f"    Renamed duplicate resource: {resource_name} → {unique_resource_name}", file=err)
+                buf.append(modified_cr)
+            else:
+                # Always add the content even if we can't extract the resource name
+                # This matches the original script behavior
+                buf.append(formatted_cr.text)
+
+        # import blocks + commands
+        if INCLUDE_IMPORTS:
+            ib = resp.get("importBlocks") or ""
+            if ib and unique_resource_name:
+                # Use the same unique name that was assigned to the resource
+                formatted_ib = formatted[ib]
+                import_resource_name = formatted_ib.resource_name
+                if import_resource_name:
+                    # Use the mapping to get the correct unique name
+                    target_name = name_mapping_per_type[asset_type].get(import_resource_name, import_resource_name)
                     
-                    # Check if it's a malformed or empty provider block
-                    if (cleaned_pb == '}' or 
-                        cleaned_pb == 'provider {' or 
-                        'provider' not in cleaned_pb or
-                        len(cleaned_pb.split('\n')) < 3):
-                        # Create a proper provider block
-                        cleaned_pb = 'provider "azurerm" {\n  features {}\n}'
+                    # Replace the import block resource name
+                    if target_name != import_resource_name:
+                        print(f"    Updated import block: {import_resource_name} → {target_name}", file=err)
+                        buf.append(formatted_ib.renamed(target_name))
                     else:
-                        # Try to format the existing block
-                        try:
-                            cleaned_pb = pretty_hcl(pb)
-                            # Double-check the result
-                            if not cleaned_pb.strip() or cleaned_pb.strip() == '}':
-                                cleaned_pb = 'provider "azurerm" {\n  features {}\n}'
-                        except:
-                            # If formatting fails, use default
-                            cleaned_pb = 'provider "azurerm" {\n  features {}\n}'
-                    
-                    (out_dir / "provider.tf").write_text(cleaned_pb + '\n', encoding="utf-8")
-                    provider_written = True
-
-            # resource HCL
-            cr = resp.get("codifiedResult") or ""
-            unique_resource_name = None
-            if cr:
-                # Check for duplicate resource names and make them unique
-                formatted_cr = pretty_hcl(cr)
-                resource_name = extract_resource_name(formatted_cr)
-                if resource_name:
-                    unique_resource_name, modified_cr = make_unique_resource_name(
-                        formatted_cr, 
-                        resource_names_per_type[asset_type], 
-                        resource_name
-                    )
-                    # Store the mapping for use with import blocks
-                    name_mapping_per_type[asset_type][resource_name] = unique_resource_name
-                    if unique_resource_name != resource_name:
-                        print(f"    Renamed duplicate resource: {resource_name} → {unique_resource_name}", file=sys.stderr)
-                    buf.append(modified_cr)
+                        buf.append(formatted_ib.text)
                 else:
-                    # Always add the content even if we can't extract the resource name
-                    # This matches the original script behavior
-                    buf.append(formatted_cr)
-
-            # import blocks + commands
-            if INCLUDE_IMPORTS:
-                ib = resp.get("importBlocks") or ""
-                if ib and unique_resource_name:
-                    # Use the same unique name that was assigned to the resource
-                    formatted_ib = pretty_hcl(ib)
-                    import_resource_name = extract_resource_name(formatted_ib)
-                    if import_resource_name:
-                        # Use the mapping to get the correct unique name
-                        target_name = name_mapping_per_type[asset_type].get(import_resource_name, import_resource_name)
-                        
-                        # Replace the import block resource name
-                        modified_ib = re.sub(
-                            r'(to\s*=\s*[^.]*\.)[^"\s]+',
-                            rf'\1{target_name}',
-                            formatted_ib
-                        )
-                        if target_name != import_resource_name:
-                            print(f"    Updated import block: {import_resource_name} → {target_name}", file=sys.stderr)
-                        buf.append(modified_ib)
-                    else:
-                        buf.append(formatted_ib)
-                elif ib:
-                    buf.append(pretty_hcl(ib))
-                        
-                ic = resp.get("importCommand") or ""
-                if ic:
-                    bat.write(ic + "\n")
+                    buf.append(formatted_ib.text)
+            elif ib:
+                buf.append(formatted[ib].text)
+                    
+            ic = resp.get("importCommand") or ""
+            if ic:
+                add_cmd(ic)
+
+    import_cmds_path.write_text("\n".join(cmd_lines) + "\n", encoding="utf-8")
 
     # Write per-type files
     written = 0
+    written_files: List[Tuple[Path, List[str]]] = []
     for asset_type, chunks in per_type.items():
-        safe_name = re.sub(r"[^A-Za-z0-9_]+", "_", asset_type).strip("_") or "misc"
+        # Asset types are almost always plain ASCII identifiers; only run the regex otherwise
+        if asset_type.isascii() and asset_type.replace("_", "a").isalnum():
+            safe_name = asset_type.strip("_") or "misc"
+        else:
+            safe_name = _RE_UNSAFE_FILENAME.sub("_", asset_type).strip("_") or "misc"
         file_path = out_dir / f"{safe_name}.tf"
-        file_path.write_text("".join(chunks), encoding="utf-8")
-        
-        # Post-process to fix duplicate id = lines
-        fix_duplicate_id_lines_in_file(file_path)
-        
+        # Stream the blocks through a large buffer instead of joining them first
+        with file_path.open("w", encoding="utf-8", buffering=1 << 20) as f:
+            f.writelines(chunks)
+        written_files.append((file_path, chunks))
         written += 1
 
-    # Ensure we have a proper provider.tf file even if none was written or it's malformed
-    provider_path = out_dir / "provider.tf"
-    if not provider_written:
-        provider_path.write_text('provider "azurerm" {\n  features {}\n}\n', encoding="utf-8")
-    else:
-        # Check if the existing provider.tf is valid
-        if provider_path.exists():
-            content = provider_path.read_text(encoding="utf-8").strip()
-            # If it's just a closing brace or otherwise malformed, replace it
-            if content == '}' or content == 'provider {' or len(content) < 10:
-                provider_path.write_text('provider "azurerm" {\n  features {}\n}\n', encoding="utf-8")
-
-    if AUTO_TERRAFORM_FMT:
-        try:
-            import shutil, subprocess
-            if shutil.which("terraform"):
-                # Windows-compatible terraform fmt command
-                subprocess.run(["terraform", "fmt", str(out_dir)], check=False, shell=True)
-        except Exception:
-            pass
+    # provider.tf: format the captured block once, falling back to a default
+    # when none was returned or it is malformed
+    default_pb = 'provider "azurerm" {\n  features {}\n}'
+    cleaned_pb = default_pb
+    if provider_block:
+        cleaned_pb = provider_block.strip()
+        
+        # Check if it's a malformed or empty provider block
+        if (cleaned_pb == '}' or 
+            cleaned_pb == 'provider {' or 
+            'provider' not in cleaned_pb or
+            len(cleaned_pb.split('\n')) < 3):
+            cleaned_pb = default_pb
+        else:
+            # Try to format the existing block
+            try:
+                cleaned_pb = pretty_hcl(provider_block)
+                # Double-check the result
+                content = cleaned_pb.strip()
+                if content == '}' or content == 'provider {' or len(content) < 10:
+                    cleaned_pb = default_pb
+            except:
+                # If formatting fails, use default
+                cleaned_pb = default_pb
+    (out_dir / "provider.tf").write_text(cleaned_pb + '\n', encoding="utf-8")
+
+    if terraform and not run_terraform_fmt(terraform, out_dir) and not layout:
+        # The files were written unindented for fmt to lay out; do it ourselves instead
+        print("    Indenting the generated files without terraform fmt", file=sys.stderr)
+        for file_path, chunks in written_files:
+            with file_path.open("w", encoding="utf-8", buffering=1 << 20) as f:
+                f.writelines(map(_layout_hcl, chunks))
 
     # Print summary of duplicate resource handling
     total_duplicates = 0
     for asset_type, names in resource_names_per_type.items():
-        duplicates = [name for name in names if '_' in name and name.split('_')[-1].isdigit()]
-        if duplicates:
-            total_duplicates += len(duplicates)
-            print(f"    {asset_type}: {len(duplicates)} duplicate resources renamed", file=sys.stderr)
+        dup_count = sum(1 for name in names if _RE_DUP_SUFFIX.search(name))
+        if dup_count:
+            total_duplicates += dup_count
+            print(f"    {asset_type}: {dup_count} duplicate resources renamed", file=sys.stderr)
     
     if total_duplicates > 0:
         print(f"    Total duplicate resources handled: {total_duplicates}", file=sys.stderr)
@@ -784,6 +1200,11 @@ def write_outputs(items: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]]) -> Non
 
 # =============== Main ===============
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Firefly Azure bulk codify")
+    parser.add_argument("--resume", action="store_true",
+                        help="reuse codify responses cached in OUT_DIR/.cache by a recent run (e.g. after an interruption)")
+    args = parser.parse_args()
+
     print("[0/7] Testing SSL connection…", file=sys.stderr)
     if not test_ssl_connection():
         print("SSL connection test failed. Please check your SSL configuration.", file=sys.stderr)
@@ -803,51 +1224,57 @@ def main() -> None:
     provider_ids = [sub]
 
     print("[3/7] Listing inventory…", file=sys.stderr)
-    assets = inventory(provider_ids)
-    if not assets:
+    # Pages are fetched in the background and fed straight into codify
+    assets = prefetch(inventory_iter(provider_ids))
+    first = next(assets, None)
+    if first is None:
         print("No assets returned.", file=sys.stderr)
         return
 
-    print("[4/7] Filtering assets…", file=sys.stderr)
-    print(f"    matched assets: {len(assets)}", file=sys.stderr)
+    print("[4/7] Filtering assets… (per inventory page)", file=sys.stderr)
 
-    # Build codify requests (AWS-style)
-    reqs: List[Dict[str, Any]] = []
-    for a in assets:
-        reqs.append({
+    # Build codify requests (AWS-style) lazily as assets arrive
+    reqs = (
+        {
             "assetType": a.get("assetType"),
             "assetId": a.get("assetId"),
             "iacType": "terraform",
             "provider": "azurerm",
             "accountNumber": sub,
-        })
-
-    print(f"[5/7] Codifying assets (total: {len(reqs)})…", file=sys.stderr)
-    codified_pairs = codify_assets(reqs, sleep_sec=0.02)
+        }
+        for a in itertools.chain([first], assets)
+    )
 
-    # Add resource group requests if RESOURCE_GROUPS is specified (after main assets)
-    if RESOURCE_GROUPS:
-        print(f"[5.5/7] Adding resource group requests for: {RESOURCE_GROUPS}", file=sys.stderr)
-        rg_reqs = []
-        for rg in RESOURCE_GROUPS:
-            # Use the correct asset ID format from inspection data
-            rg_asset_id = f"arn:azurerm::::/subscriptions/{sub}/resourceGroups/{rg}"
-            rg_reqs.append({
-                "assetType": "azurerm_resource_group",
-                "assetId": rg_asset_id,
-                "iacType": "terraform",
-                "provider": "azurerm",
-                "accountNumber": sub,
-            })
-            print(f"    Resource group asset ID: {rg_asset_id}", file=sys.stderr)
-        
-        # Try to codify resource groups separately
-        print(f"    Attempting to codify {len(rg_reqs)} resource groups...", file=sys.stderr)
-        rg_codified_pairs = codify_assets(rg_reqs, sleep_sec=0.02)
-        
-        # Add successful resource group codifications to the main list
-        codified_pairs.extend(rg_codified_pairs)
-        print(f"    Successfully codified {len(rg_codified_pairs)} resource groups", file=sys.stderr)
+    cache = open_codify_cache()
+    try:
+        print("[5/7] Codifying assets (streaming from inventory)…", file=sys.stderr)
+        codified_pairs = codify_assets(reqs, cache=cache, resume=args.resume)
+
+        # Add resource group requests if RESOURCE_GROUPS is specified (after main assets)
+        if RESOURCE_GROUPS:
+            print(f"[5.5/7] Adding resource group requests for: {RESOURCE_GROUPS}", file=sys.stderr)
+            rg_reqs = []
+            for rg in RESOURCE_GROUPS:
+                # Use the correct asset ID format from inspection data
+                rg_asset_id = f"arn:azurerm::::/subscriptions/{sub}/resourceGroups/{rg}"
+                rg_reqs.append({
+                    "assetType": "azurerm_resource_group",
+                    "assetId": rg_asset_id,
+                    "iacType": "terraform",
+                    "provider": "azurerm",
+                    "accountNumber": sub,
+                })
+                print(f"    Resource group asset ID: {rg_asset_id}", file=sys.stderr)
+            
+            # Try to codify resource groups separately
+            print(f"    Attempting to codify {len(rg_reqs)} resource groups...", file=sys.stderr)
+            rg_codified_pairs = codify_assets(rg_reqs, cache=cache, resume=args.resume)
+            
+            # Add successful resource group codifications to the main list
+            codified_pairs.extend(rg_codified_pairs)
+            print(f"    Successfully codified {len(rg_codified_pairs)} resource groups", file=sys.stderr)
+    finally:
+        cache.close()
 
     print("[6/7] Writing outputs…", file=sys.stderr)
     write_outputs(codified_pairs)
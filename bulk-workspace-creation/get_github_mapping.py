@@ -7,15 +7,22 @@ The mapping can be output as a nested dictionary structure or saved to a JSON fi
 import os
 import json
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any, Optional, Tuple
-from urllib.parse import urlparse
+from urllib.parse import quote, urlparse
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
 except ImportError:
     print("Error: 'requests' library is required. Install it with: pip install requests")
     sys.exit(1)
 
+try:
+    import orjson  # optional: faster JSON encode/decode
+except ImportError:
+    orjson = None
+
 # Hardcoded GitHub token (replace with your actual token)
 GITHUB_TOKEN = "GITHUB_TOKEN"
 
@@ -24,6 +31,27 @@ REPOS_TO_MAP = [
 #    "REPOS_TO_MAP_EXAMPLE_1",
 ]
 
+# Number of repositories mapped in parallel when processing an organization
+MAX_WORKERS = 16
+# HTTP connection pool size shared by all workers
+HTTP_POOL_SIZE = 32
+
+# ETag cache of previously mapped trees, reused across runs via conditional requests
+CACHE_FILE = ".gh_mapping_cache.json"
+
+
+def create_session() -> requests.Session:
+    """
+    Create a requests session with a connection pool sized for MAX_WORKERS.
+    
+    Returns:
+        Session that reuses TCP/TLS connections to the GitHub API
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    return session
+
 
 def parse_repo_input(repo_input: str) -> Tuple[str, Optional[str], bool]:
     """
@@ -65,13 +93,52 @@ def parse_repo_input(repo_input: str) -> Tuple[str, Optional[str], bool]:
     return repo_input, None, True
 
 
-def get_organization_repos(org: str, token: Optional[str] = None) -> list:
+def load_cache(cache_file: str = CACHE_FILE) -> Dict[str, Dict[str, Any]]:
+    """
+    Load the ETag cache from disk.
+    
+    Args:
+        cache_file: Path to the cache JSON file
+    
+    Returns:
+        Dictionary of {repo: {"etag": ..., "mapping": ...}}, empty if missing or unreadable
+    """
+    try:
+        with open(cache_file, 'rb') as f:
+            data = f.read()
+        cache = orjson.loads(data) if orjson is not None else json.loads(data)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache: Dict[str, Dict[str, Any]], cache_file: str = CACHE_FILE) -> None:
+    """
+    Save the ETag cache to disk.
+    
+    Args:
+        cache: Dictionary of {repo: {"etag": ..., "mapping": ...}}
+        cache_file: Path to the cache JSON file
+    """
+    try:
+        if orjson is not None:
+            with open(cache_file, 'wb') as f:
+                f.write(orjson.dumps(cache))
+        else:
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+    except OSError as e:
+        print(f"Warning: Could not save cache to {cache_file}: {e}")
+
+
+def get_organization_repos(org: str, token: Optional[str] = None, session: Optional[requests.Session] = None) -> list:
     """
     Get all repositories for an organization.
     
     Args:
         org: Organization name
         token: GitHub personal access token
+        session: Optional requests session to reuse connections
     
     Returns:
         List of repository names (owner/repo format)
@@ -85,6 +152,7 @@ def get_organization_repos(org: str, token: Optional[str] = None) -> list:
     if token:
         headers["Authorization"] = f"token {token}"
     
+    http = session or requests
     repos = []
     page = 1
     per_page = 100
@@ -92,7 +160,7 @@ def get_organization_repos(org: str, token: Optional[str] = None) -> list:
     while True:
         org_url = f"{base_url}/orgs/{org}/repos?page={page}&per_page={per_page}&type=all"
         try:
-            response = requests.get(org_url, headers=headers)
+            response = http.get(org_url, headers=headers)
             response.raise_for_status()
             repo_list = response.json()
             
@@ -127,7 +195,9 @@ def get_github_token() -> Optional[str]:
     return os.environ.get('GITHUB_TOKEN') or os.environ.get('GH_TOKEN')
 
 
-def create_directory_mapping(owner: str, repo: str, token: Optional[str] = None, branch: Optional[str] = None) -> Dict[str, Any]:
+def create_directory_mapping(owner: str, repo: str, token: Optional[str] = None, branch: Optional[str] = None,
+                             session: Optional[requests.Session] = None,
+                             cache: Optional[Dict[str, Dict[str, Any]]] = None) -> Tuple[Dict[str, Any], int]:
     """
     Create a nested dictionary mapping of all directories from a GitHub repository.
     
@@ -136,9 +206,12 @@ def create_directory_mapping(owner: str, repo: str, token: Optional[str] = None,
         repo: Repository name
         token: GitHub personal access token (optional, for private repos or higher rate limits)
         branch: Branch name (default: default branch)
+        session: Optional requests session to reuse connections
+        cache: Optional ETag cache; an unchanged tree (304) returns the cached mapping
     
     Returns:
-        A nested dictionary representing the directory structure
+        Tuple of (mapping, dir_count): a nested dictionary representing the
+        directory structure and the number of directories in it
     """
     base_url = "https://api.github.com"
     headers = {
@@ -149,43 +222,50 @@ def create_directory_mapping(owner: str, repo: str, token: Optional[str] = None,
     if token:
         headers["Authorization"] = f"token {token}"
     
-    # Get default branch if not specified
-    if not branch:
-        repo_url = f"{base_url}/repos/{owner}/{repo}"
-        try:
-            response = requests.get(repo_url, headers=headers)
-            response.raise_for_status()
-            repo_data = response.json()
-            branch = repo_data.get("default_branch", "main")
-        except requests.exceptions.RequestException as e:
-            raise ValueError(f"Failed to fetch repository info: {e}")
+    http = session or requests
+    
+    # Fetch the recursive tree in a single call. The trees endpoint accepts a
+    # branch name directly, and HEAD resolves to the default branch, so the
+    # separate repository-info and ref lookups are not needed.
+    tree_ref = quote(branch, safe='') if branch else "HEAD"
+    tree_url = f"{base_url}/repos/{owner}/{repo}/git/trees/{tree_ref}?recursive=1"
+    
+    # Revalidate against the cached ETag; a 304 has no body and does not
+    # count against the rate limit
+    cache_key = f"{owner}/{repo}@{branch}" if branch else f"{owner}/{repo}"
+    cached = cache.get(cache_key) if cache is not None else None
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
     
-    # Get the tree SHA for the branch
-    ref_url = f"{base_url}/repos/{owner}/{repo}/git/ref/heads/{branch}"
     try:
-        response = requests.get(ref_url, headers=headers)
+        response = http.get(tree_url, headers=headers)
         if response.status_code == 404:
-            raise ValueError(f"Branch '{branch}' not found. Repository may not exist or you may not have access.")
+            branch_label = f"Branch '{branch}'" if branch else "Default branch"
+            raise ValueError(f"{branch_label} not found. Repository may not exist or you may not have access.")
+        if response.status_code == 304 and cached:
+            mapping = cached["mapping"]
+            dir_count = cached.get("count")
+            if dir_count is None:
+                dir_count = count_directories(mapping)
+            return mapping, dir_count
         response.raise_for_status()
-        ref_data = response.json()
-        tree_sha = ref_data["object"]["sha"]
     except requests.exceptions.RequestException as e:
-        raise ValueError(f"Failed to fetch branch reference: {e}")
+        raise ValueError(f"Failed to fetch repository tree: {e}")
     
-    # Get recursive tree (all files and directories)
-    tree_url = f"{base_url}/repos/{owner}/{repo}/git/trees/{tree_sha}?recursive=1"
     try:
-        response = requests.get(tree_url, headers=headers)
-        response.raise_for_status()
-        tree_data = response.json()
-    except requests.exceptions.RequestException as e:
-        raise ValueError(f"Failed to fetch repository tree: {e}")
+        tree_data = orjson.loads(response.content) if orjson is not None else json.loads(response.content)
+    except ValueError as e:
+        raise ValueError(f"Invalid repository tree response: {e}")
     
     # Filter for directories only (type == 'tree')
     directories = [item for item in tree_data.get("tree", []) if item.get("type") == "tree"]
     
-    # Build nested dictionary structure from paths
+    # Build nested dictionary structure from paths. The recursive tree lists
+    # entries depth-first, so keep a stack of (path prefix, node) frames and
+    # only walk the components below the deepest matching ancestor.
     mapping = {}
+    dir_count = 0
+    stack = [("", mapping)]
     
     for dir_item in directories:
         path = dir_item.get("path", "")
@@ -193,17 +273,47 @@ def create_directory_mapping(owner: str, repo: str, token: Optional[str] = None,
         if path.startswith('.'):
             continue
         
-        # Split path into parts
-        parts = path.split('/')
+        # Pop back to the closest ancestor of this path
+        while len(stack) > 1 and not path.startswith(stack[-1][0]):
+            stack.pop()
+        prefix, current = stack[-1]
         
-        # Navigate/create nested structure
-        current = mapping
-        for part in parts:
-            if part not in current:
-                current[part] = {}
-            current = current[part]
-    
-    return mapping
+        # Navigate/create nested structure below that ancestor, counting
+        # each directory as it is first created
+        for part in path[len(prefix):].split('/'):
+            child = current.get(part)
+            if child is None:
+                child = current[part] = {}
+                dir_count += 1
+            current = child
+        stack.append((path + '/', current))
+    
+    etag = response.headers.get("ETag")
+    if cache is not None and etag:
+        cache[cache_key] = {"etag": etag, "mapping": mapping, "count": dir_count}
+    
+    return mapping, dir_count
+
+
+def count_directories(mapping: Dict[str, Any]) -> int:
+    """
+    Count all directories in a nested directory mapping.
+    
+    Args:
+        mapping: The directory mapping dictionary
+    
+    Returns:
+        Total number of directories at every nesting level
+    """
+    count = 0
+    stack = [mapping]
+    while stack:
+        for value in stack.pop().values():
+            if isinstance(value, dict):
+                count += 1
+                if value:
+                    stack.append(value)
+    return count
 
 
 def print_mapping(mapping: Dict[str, Any], indent: int = 0) -> None:
@@ -229,8 +339,13 @@ def save_mapping_to_json(mapping: Dict[str, Any], output_file: str) -> None:
         mapping: The directory mapping dictionary
         output_file: Path to the output JSON file
     """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(mapping, f, indent=2, ensure_ascii=False)
+    # orjson's indented output matches json.dump(indent=2, ensure_ascii=False)
+    if orjson is not None:
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(mapping, option=orjson.OPT_INDENT_2))
+    else:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(mapping, f, indent=2, ensure_ascii=False)
     print(f"\nMapping saved to: {output_file}")
 
 
@@ -246,6 +361,8 @@ def main():
         
         # Process all hardcoded repos/organizations
         all_mappings = {}
+        session = create_session()
+        cache = load_cache()
         
         for repo_input in REPOS_TO_MAP:
             owner, repo, is_org = parse_repo_input(repo_input)
@@ -257,36 +374,40 @@ def main():
                 print(f"{'='*60}")
                 
                 try:
-                    org_repos = get_organization_repos(owner, token=token)
+                    org_repos = get_organization_repos(owner, token=token, session=session)
                     print(f"Found {len(org_repos)} repositories in organization")
                     
-                    for repo_name in org_repos:
-                        repo_owner, repo_name_only = repo_name.split('/')
-                        print(f"\nFetching directory mapping for: {repo_name}")
-                        
-                        try:
-                            repo_mapping = create_directory_mapping(
-                                repo_owner, 
-                                repo_name_only, 
-                                token=token
+                    # Fetch repositories in parallel; results are collected
+                    # here in the main thread so all_mappings is never shared
+                    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                        futures = {}
+                        for repo_name in org_repos:
+                            repo_owner, repo_name_only = repo_name.split('/')
+                            future = executor.submit(
+                                create_directory_mapping,
+                                repo_owner,
+                                repo_name_only,
+                                token=token,
+                                session=session,
+                                cache=cache
                             )
-                            all_mappings[repo_name] = repo_mapping
-                            
-                            # Count directories for this repo
-                            def count_directories(m: Dict[str, Any]) -> int:
-                                count = 0
-                                for value in m.values():
-                                    if isinstance(value, dict):
-                                        count += 1
-                                        if any(isinstance(v, dict) for v in value.values()):
-                                            count += count_directories(value)
-                                return count
+                            futures[future] = repo_name
+                        
+                        # Keep the output file in the organization's repo order
+                        for repo_name in org_repos:
+                            all_mappings[repo_name] = None
+                        
+                        for future in as_completed(futures):
+                            repo_name = futures[future]
+                            print(f"\nFetched directory mapping for: {repo_name}")
                             
-                            total_dirs = count_directories(repo_mapping)
-                            print(f"  ✓ Mapped {total_dirs} directories")
-                        except Exception as e:
-                            print(f"  ✗ Error mapping {repo_name}: {e}")
-                            all_mappings[repo_name] = {"error": str(e)}
+                            try:
+                                repo_mapping, total_dirs = future.result()
+                                all_mappings[repo_name] = repo_mapping
+                                print(f"  ✓ Mapped {total_dirs} directories")
+                            except Exception as e:
+                                print(f"  ✗ Error mapping {repo_name}: {e}")
+                                all_mappings[repo_name] = {"error": str(e)}
                 
                 except Exception as e:
                     print(f"Error processing organization {owner}: {e}")
@@ -299,20 +420,8 @@ def main():
                 print(f"{'='*60}")
                 
                 try:
-                    repo_mapping = create_directory_mapping(owner, repo, token=token)
+                    repo_mapping, total_dirs = create_directory_mapping(owner, repo, token=token, session=session, cache=cache)
                     all_mappings[f"{owner}/{repo}"] = repo_mapping
-                    
-                    # Count directories
-                    def count_directories(m: Dict[str, Any]) -> int:
-                        count = 0
-                        for value in m.values():
-                            if isinstance(value, dict):
-                                count += 1
-                                if any(isinstance(v, dict) for v in value.values()):
-                                    count += count_directories(value)
-                        return count
-                    
-                    total_dirs = count_directories(repo_mapping)
                     print(f"Total directories mapped: {total_dirs}")
                 
                 except Exception as e:
@@ -322,6 +431,7 @@ def main():
         # Save all mappings to JSON file
         output_file = "github_directory_mapping.json"
         save_mapping_to_json(all_mappings, output_file)
+        save_cache(cache)
         
         # Print summary
         print(f"\n{'='*60}")
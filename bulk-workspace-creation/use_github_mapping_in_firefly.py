@@ -4,16 +4,40 @@ Script to create Firefly workflows from GitHub directory mapping.
 Reads the GitHub directory mapping JSON and creates a Firefly workspace for each subdirectory.
 """
 
+import base64
+import hashlib
 import json
+import os
+import re
 import sys
-from typing import Dict, Any, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:
     print("Error: 'requests' library is required. Install it with: pip install requests")
     sys.exit(1)
 
+try:
+    import orjson  # optional: faster JSON encode/decode
+except ImportError:
+    orjson = None
+
+try:
+    import ijson  # optional: stream the mapping file one repository at a time
+except ImportError:
+    ijson = None
+
+try:
+    from tqdm import tqdm  # optional: progress bar instead of per-workspace output
+except ImportError:
+    tqdm = None
+
 # ============================================================================
 # Firefly API Configuration - Hardcoded values (modify as needed)
 # ============================================================================
@@ -50,17 +74,108 @@ WORKSPACE_VARIABLES = [
 
 # Optional Configuration
 PROJECT_ID = None  # Project ID or None for global access
+
+# Configuration checks run before authenticating, so bad settings never reach the API
+REQUIRED = [
+    ("ACCESS_KEY", ACCESS_KEY, "YOUR_ACCESS_KEY"),
+    ("SECRET_KEY", SECRET_KEY, "YOUR_SECRET_KEY"),
+    ("VCS_ID", VCS_ID, "YOUR_VCS_INTEGRATION_ID"),
+]
+ALLOWED_VCS = {"github", "gitlab", "bitbucket", "codecommit", "azuredevops"}
+ALLOWED_RUNNERS = {"github-actions", "gitlab-pipelines", "bitbucket-pipelines", "azure-pipelines",
+                   "jenkins", "semaphore", "atlantis", "env0", "firefly", "unrecognized"}
+ALLOWED_IAC = {"terraform", "terragrunt", "opentofu"}
+ALLOWED_TRIGGERS = {"merge", "push", "pull_request"}
+ALLOWED_APPLY_RULES = {"manual", "auto"}
+VERSION_PATTERN = re.compile(r"\d+\.\d+\.\d+")
 CONSUMED_VARIABLE_SETS = []  # Array of variable set IDs
 
+# Concurrency Configuration
+MAX_WORKERS = 32  # Number of workspaces created in parallel
+HTTP_RETRIES = 5  # Retries on throttling (429/503) and connection failures
+HTTP_BACKOFF = 0.3  # Exponential backoff factor between retries (seconds)
+
 # Input/Output Files
 MAPPING_JSON_FILE = "github_directory_mapping.json"
-OUTPUT_LOG_FILE = "firefly_workflows_created.json"
+OUTPUT_LOG_FILE = "firefly_workflows_created.jsonl"  # JSON Lines: one workspace per line, then a summary
+
+# Access token cache, reused across runs while fresh (set TTL to 0 to always log in).
+# Kept in the per-user cache directory, away from the working tree and its outputs
+TOKEN_CACHE_FILE = os.path.join(
+    os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "firefly", "workspace_token.json"
+)
+TOKEN_CACHE_TTL = 3600  # seconds
+TOKEN_LIFETIME = 24 * 3600  # assumed validity when the token carries no exp claim
+TOKEN_REFRESH_MARGIN = 30  # seconds before expiry to log in again
 
 
 # ============================================================================
 # Helper Functions
 # ============================================================================
 
+def create_session() -> requests.Session:
+    """
+    Create the shared HTTP session: pooled keep-alive connections for the
+    workers, and retries with backoff for requests the API rejected before
+    processing them.
+    
+    Workspace creation is not idempotent, so only throttling responses (429/503,
+    honouring Retry-After) and failures to connect are retried; a request that
+    may have reached the server (read errors, other 5xx) is reported instead.
+    
+    Returns:
+        Configured requests session
+    """
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=0,
+        status=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        status_forcelist=[429, 503],
+        allowed_methods=["GET", "POST"],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS, max_retries=retry)
+    session.mount("https://", adapter)
+    return session
+
+
+SESSION = create_session()
+
+
+# Request body fields that come from the constant configuration above, built
+# once; each workspace only adds its own name, repository and directory
+_BODY_TEMPLATE: Dict[str, Any] = {
+    "runnerType": RUNNER_TYPE,
+    "iacType": IAC_TYPE,
+    "vcsId": VCS_ID,
+    "defaultBranch": DEFAULT_BRANCH,
+    "vcsType": VCS_TYPE,
+    "variables": WORKSPACE_VARIABLES,
+    "execution": {
+        "triggers": EXECUTION_TRIGGERS,
+        "applyRule": APPLY_RULE,
+        "terraformVersion": TERRAFORM_VERSION
+    }
+}
+if PROJECT_ID is not None:
+    _BODY_TEMPLATE["project"] = PROJECT_ID
+if CONSUMED_VARIABLE_SETS:
+    _BODY_TEMPLATE["consumedVariableSets"] = CONSUMED_VARIABLE_SETS
+
+# The template serialized once, without its closing brace, so each request
+# only encodes its own fields and appends them
+_BODY_PREFIX = json.dumps(_BODY_TEMPLATE)[:-1].encode("utf-8")
+
+
+def _json_bytes(value: str) -> bytes:
+    return json.dumps(value).encode("utf-8")
+
+
 def login_to_firefly() -> str:
     """
     Authenticate with Firefly API using access key and secret key.
@@ -83,7 +198,7 @@ def login_to_firefly() -> str:
     }
     
     try:
-        response = requests.post(login_url, json=body, headers=headers)
+        response = SESSION.post(login_url, json=body, headers=headers)
         response.raise_for_status()
         
         data = response.json()
@@ -97,13 +212,163 @@ def login_to_firefly() -> str:
         raise ValueError(f"Failed to authenticate with Firefly API: {e}")
 
 
-def get_all_subdirectories(directory_structure: Dict[str, Any], base_path: str = "") -> List[str]:
+def _token_expiry(token: str) -> Optional[float]:
+    """
+    Read the expiry time from a JWT access token's exp claim.
+    
+    Args:
+        token: Access token string
+    
+    Returns:
+        Expiry as a Unix timestamp, or None if the token is not a JWT with an exp claim
+    """
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        exp = claims.get("exp")
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError, AttributeError):
+        return None
+
+
+class TokenCache:
+    """
+    Thread-safe holder for the Firefly access token.
+    
+    Reuses the token saved by a previous run while it is fresher than
+    TOKEN_CACHE_TTL, and logs in again TOKEN_REFRESH_MARGIN seconds before the
+    token expires (from its JWT exp claim, or TOKEN_LIFETIME after login) or
+    after the API rejects it (see invalidate).
+    """
+    
+    def __init__(self, cache_file: str = TOKEN_CACHE_FILE):
+        self.cache_file = cache_file
+        self._key = hashlib.sha256(ACCESS_KEY.encode("utf-8")).hexdigest()
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._refresh_at = 0.0
+        self._cache_checked = False
+    
+    def _refresh_time(self, token: str, issued_at: float) -> float:
+        expiry = _token_expiry(token)
+        if expiry is None:
+            expiry = issued_at + TOKEN_LIFETIME
+        return expiry - TOKEN_REFRESH_MARGIN
+    
+    def _load(self) -> Optional[str]:
+        if TOKEN_CACHE_TTL <= 0:
+            return None
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            token, issued_at = cached.get("token"), cached.get("ts", 0)
+            if cached.get("key") != self._key or not token or time.time() - issued_at >= TOKEN_CACHE_TTL:
+                return None
+        except (OSError, ValueError, AttributeError):
+            return None
+        self._refresh_at = self._refresh_time(token, issued_at)
+        return token if time.time() < self._refresh_at else None
+    
+    def _save(self, token: str, issued_at: float) -> None:
+        if TOKEN_CACHE_TTL <= 0:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), mode=0o700, exist_ok=True)
+            # Owner-only permissions: the file holds a bearer token (the mode
+            # only applies on creation, so tighten an existing file as well)
+            fd = os.open(self.cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"ts": issued_at, "key": self._key, "token": token}, f)
+            os.chmod(self.cache_file, 0o600)
+        except OSError:
+            pass
+    
+    def invalidate(self, token: str) -> None:
+        """
+        Drop a token the API rejected, so the next get_token() logs in again.
+        
+        Args:
+            token: The rejected access token; ignored if already replaced
+        """
+        with self._lock:
+            if token != self._token:
+                return
+            self._token = None
+            self._refresh_at = 0.0
+            try:
+                os.remove(self.cache_file)
+            except OSError:
+                pass
+    
+    def get_token(self) -> str:
+        """
+        Return a valid access token, logging in only when needed.
+        
+        Returns:
+            Access token string
+        
+        Raises:
+            ValueError: If authentication fails
+        """
+        with self._lock:
+            if self._token and time.time() < self._refresh_at:
+                return self._token
+            
+            token = None
+            if not self._cache_checked:
+                self._cache_checked = True
+                token = self._load()
+            if not token:
+                issued_at = time.time()
+                token = login_to_firefly()
+                self._refresh_at = self._refresh_time(token, issued_at)
+                self._save(token, issued_at)
+            self._token = token
+            return token
+
+
+def _json_line(obj: Any) -> bytes:
+    """Encode one JSON Lines record (UTF-8, newline-terminated)."""
+    if orjson is not None:
+        return orjson.dumps(obj) + b"\n"
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+# Console section separator
+SEP = "=" * 70
+
+
+# Errors raised while parsing the mapping file
+MAPPING_ERRORS = (ValueError,) + ((ijson.JSONError,) if ijson is not None else ())
+
+
+def iter_mapping(f) -> Iterator[Tuple[str, Any]]:
     """
-    Recursively extract only leaf directory paths (end directories with no subdirectories).
+    Yield (repo, directory_structure) pairs from the open mapping file.
+    
+    With ijson installed the file is parsed incrementally, so workspaces for
+    the first repositories are created while later ones are still being read.
+    
+    Args:
+        f: Mapping JSON file opened in binary mode
+    
+    Raises:
+        MAPPING_ERRORS: If the file is not valid JSON
+    """
+    if ijson is not None:
+        yield from ijson.kvitems(f, '', use_float=True)
+    else:
+        data = f.read()
+        mapping_data = orjson.loads(data) if orjson is not None else json.loads(data)
+        yield from mapping_data.items()
+
+
+def get_all_subdirectories(directory_structure: Dict[str, Any]) -> List[str]:
+    """
+    Extract only leaf directory paths (end directories with no subdirectories).
     
     Args:
         directory_structure: Nested dictionary representing directory structure
-        base_path: Current base path (for recursion)
     
     Returns:
         List of only leaf directory paths (directories with no subdirectories)
@@ -122,17 +387,21 @@ def get_all_subdirectories(directory_structure: Dict[str, Any], base_path: str =
         Output: ["aws/something/more/nested/directories", "aws/something/more/123"]
     """
     paths = []
-    
-    for dir_name, subdirs in directory_structure.items():
-        # Build the full path for this directory
-        current_path = f"{base_path}/{dir_name}" if base_path else dir_name
-        
-        # If this directory has no subdirectories (is a leaf), add it
-        if not subdirs or subdirs == {}:
-            paths.append(current_path)
+    # Depth-first walk with an explicit stack of (remaining entries, parent
+    # path parts); paths are only joined once, when a leaf is reached
+    stack = [(iter(directory_structure.items()), [])]
+    
+    while stack:
+        entries, parts = stack[-1]
+        for dir_name, subdirs in entries:
+            if subdirs:
+                # Descend into subdirectories, resuming this level afterwards
+                stack.append((iter(subdirs.items()), parts + [dir_name]))
+                break
+            # This directory has no subdirectories (is a leaf)
+            paths.append("/".join(parts + [dir_name]))
         else:
-            # If this directory has subdirectories, recurse to find leaf directories
-            paths.extend(get_all_subdirectories(subdirs, current_path))
+            stack.pop()
     
     return paths
 
@@ -142,7 +411,8 @@ def create_firefly_workspace(
     work_dir: str,
     workspace_name: str,
     access_token: str,
-    description: str = None
+    description: str = None,
+    session: Optional[requests.Session] = None
 ) -> Dict[str, Any]:
     """
     Create a Firefly workspace using the Firefly API.
@@ -153,9 +423,11 @@ def create_firefly_workspace(
         workspace_name: Unique workspace name (full path format: owner/repo/subdir)
         access_token: Firefly API access token from login
         description: Optional workspace description
+        session: Optional requests session to reuse connections
     
     Returns:
-        API response dictionary
+        Result dictionary; on success "data" holds only the created workspace's
+        "id", the one field the caller records
     """
     url = f"{FIREFLY_API_BASE_URL}/v2/runners/workspaces"
     
@@ -165,49 +437,43 @@ def create_firefly_workspace(
         "Accept": "application/json"
     }
     
-    # Build request body according to Firefly API documentation
-    request_body = {
-        "runnerType": RUNNER_TYPE,
-        "iacType": IAC_TYPE,
-        "workspaceName": workspace_name,
-        "vcsId": VCS_ID,
-        "repo": repo,
-        "defaultBranch": DEFAULT_BRANCH,
-        "vcsType": VCS_TYPE,
-        "workDir": work_dir,
-        "variables": WORKSPACE_VARIABLES,
-        "execution": {
-            "triggers": EXECUTION_TRIGGERS,
-            "applyRule": APPLY_RULE,
-            "terraformVersion": TERRAFORM_VERSION
-        }
-    }
+    # Build request body according to Firefly API documentation: the
+    # pre-serialized template plus this workspace's fields
+    request_body = [
+        _BODY_PREFIX,
+        b',"workspaceName":', _json_bytes(workspace_name),
+        b',"repo":', _json_bytes(repo),
+        b',"workDir":', _json_bytes(work_dir),
+    ]
     
     # Add optional fields if provided
     if description:
-        request_body["description"] = description
+        request_body += [b',"description":', _json_bytes(description)]
     
-    if PROJECT_ID is not None:
-        request_body["project"] = PROJECT_ID
-    
-    if CONSUMED_VARIABLE_SETS:
-        request_body["consumedVariableSets"] = CONSUMED_VARIABLE_SETS
+    request_body.append(b'}')
     
     try:
-        response = requests.post(url, json=request_body, headers=headers)
+        response = (session or SESSION).post(url, data=b"".join(request_body), headers=headers)
         response.raise_for_status()
-        return {
-            "success": True,
-            "status_code": response.status_code,
-            "data": response.json()
-        }
     except requests.exceptions.RequestException as e:
+        response_text = getattr(e.response, 'text', None) if hasattr(e, 'response') else None
         return {
             "success": False,
             "error": str(e),
             "status_code": getattr(e.response, 'status_code', None) if hasattr(e, 'response') else None,
-            "response_text": getattr(e.response, 'text', None) if hasattr(e, 'response') else None
+            "response_text": response_text[:200] if response_text else response_text
         }
+    
+    # The workspace exists at this point, so an unreadable body only loses its ID
+    try:
+        data = orjson.loads(response.content) if orjson is not None else json.loads(response.content)
+    except ValueError:
+        data = None
+    return {
+        "success": True,
+        "status_code": response.status_code,
+        "data": {"id": data.get("id") if isinstance(data, dict) else None}
+    }
 
 
 def generate_workspace_name(repo: str, work_dir: str) -> str:
@@ -248,6 +514,36 @@ def format_work_dir(work_dir: str) -> str:
     return work_dir
 
 
+def validate_config() -> Optional[str]:
+    """
+    Check the hardcoded configuration before any network I/O.
+    
+    Returns:
+        Error message for the first invalid setting, or None if all are valid
+    """
+    for name, value, sentinel in REQUIRED:
+        if value == sentinel:
+            return f"Please set {name} in the script!"
+    
+    for name, value, allowed in (
+        ("VCS_TYPE", VCS_TYPE, ALLOWED_VCS),
+        ("RUNNER_TYPE", RUNNER_TYPE, ALLOWED_RUNNERS),
+        ("IAC_TYPE", IAC_TYPE, ALLOWED_IAC),
+        ("APPLY_RULE", APPLY_RULE, ALLOWED_APPLY_RULES),
+    ):
+        if value not in allowed:
+            return f"Invalid {name} '{value}'. Options: {', '.join(sorted(allowed))}"
+    
+    unknown_triggers = [t for t in EXECUTION_TRIGGERS if t not in ALLOWED_TRIGGERS]
+    if not EXECUTION_TRIGGERS or unknown_triggers:
+        return f"Invalid EXECUTION_TRIGGERS {EXECUTION_TRIGGERS}. Options: {', '.join(sorted(ALLOWED_TRIGGERS))}"
+    
+    if not VERSION_PATTERN.fullmatch(TERRAFORM_VERSION):
+        return f"Invalid TERRAFORM_VERSION '{TERRAFORM_VERSION}'. Expected a version like 1.5.7"
+    
+    return None
+
+
 # ============================================================================
 # Main Function
 # ============================================================================
@@ -256,42 +552,30 @@ def main():
     """Main function to process GitHub mapping and create Firefly workflows."""
     
     # Validate configuration
-    if ACCESS_KEY == "YOUR_ACCESS_KEY":
-        print("ERROR: Please set ACCESS_KEY in the script!")
-        return 1
-    
-    if SECRET_KEY == "YOUR_SECRET_KEY":
-        print("ERROR: Please set SECRET_KEY in the script!")
-        return 1
-    
-    if VCS_ID == "YOUR_VCS_INTEGRATION_ID":
-        print("ERROR: Please set VCS_ID in the script!")
+    config_error = validate_config()
+    if config_error:
+        print(f"ERROR: {config_error}")
         return 1
     
     # Authenticate with Firefly API
     print("Authenticating with Firefly API...")
+    token_cache = TokenCache()
     try:
-        access_token = login_to_firefly()
+        token_cache.get_token()
         print("✓ Authentication successful")
     except ValueError as e:
         print(f"ERROR: {e}")
         return 1
     
-    # Load GitHub directory mapping
+    # Open GitHub directory mapping; it is parsed as repositories are processed
     try:
-        with open(MAPPING_JSON_FILE, 'r', encoding='utf-8') as f:
-            mapping_data = json.load(f)
+        mapping_file = open(MAPPING_JSON_FILE, 'rb')
     except FileNotFoundError:
         print(f"ERROR: Mapping file '{MAPPING_JSON_FILE}' not found!")
         print("Please run get_github_mapping.py first to generate the mapping.")
         return 1
-    except json.JSONDecodeError as e:
-        print(f"ERROR: Invalid JSON in '{MAPPING_JSON_FILE}': {e}")
-        return 1
     
-    print("="*70)
-    print("Creating Firefly Workflows from GitHub Directory Mapping")
-    print("="*70)
+    print(f"{SEP}\nCreating Firefly Workflows from GitHub Directory Mapping\n{SEP}")
     print(f"\nConfiguration:")
     print(f"  API Base URL: {FIREFLY_API_BASE_URL}")
     print(f"  VCS Type: {VCS_TYPE}")
@@ -303,49 +587,119 @@ def main():
     print(f"  Triggers: {', '.join(EXECUTION_TRIGGERS)}")
     print()
     
-    # Process each repository
+    # Process each repository; only the counters are kept in memory, each
+    # workspace result is appended to the log as soon as it is known
     results = {
-        "total_repos": len(mapping_data),
+        "total_repos": 0,
         "total_workflows_created": 0,
         "total_workflows_failed": 0,
-        "workflows": []
+        "total_duplicates_skipped": 0
     }
-    
-    for repo, directory_structure in mapping_data.items():
-        print(f"\n{'='*70}")
-        print(f"Processing Repository: {repo}")
-        print(f"{'='*70}")
-        
-        # Get all subdirectories for this repo
-        subdirectories = get_all_subdirectories(directory_structure)
-        
-        if not subdirectories:
-            print(f"  No subdirectories found in {repo}")
-            continue
-        
-        print(f"  Found {len(subdirectories)} subdirectories")
-        
-        # Create workflow for each subdirectory
-        for work_dir in subdirectories:
-            # Format work directory with leading slash
-            formatted_work_dir = format_work_dir(work_dir)
-            
-            # Generate workspace name: owner/repo/subdir
-            workspace_name = generate_workspace_name(repo, work_dir)
-            description = f"Workflow for {repo}{formatted_work_dir}"
-            
-            print(f"\n  Creating workspace: {workspace_name}")
-            print(f"    Repository: {repo}")
-            print(f"    Work Directory: {formatted_work_dir}")
-            
-            # Create the workspace
+    try:
+        log_file = open(OUTPUT_LOG_FILE, 'wb')
+    except OSError as e:
+        print(f"\nWarning: Could not open results file: {e}")
+        log_file = None
+    
+    def create_job(job):
+        repo, formatted_work_dir, workspace_name, description = job
+        try:
+            # Refreshed here if it expired during a long run
+            access_token = token_cache.get_token()
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+        result = create_firefly_workspace(
+            repo=repo,
+            work_dir=formatted_work_dir,
+            workspace_name=workspace_name,
+            access_token=access_token,
+            description=description,
+            session=SESSION
+        )
+        if result.get("status_code") == 401:
+            # Rejected token (e.g. revoked while cached): nothing was created,
+            # so log in again and retry once
+            token_cache.invalidate(access_token)
+            try:
+                access_token = token_cache.get_token()
+            except ValueError as e:
+                return {"success": False, "error": str(e)}
             result = create_firefly_workspace(
                 repo=repo,
                 work_dir=formatted_work_dir,
                 workspace_name=workspace_name,
                 access_token=access_token,
-                description=description
+                description=description,
+                session=SESSION
             )
+        return result
+    
+    jobs = []
+    futures = []
+    # (repo, work dir) pairs already submitted; "aws" and "/aws", or a repository
+    # listed twice, would otherwise POST the same workspace again and fail
+    planned = set()
+    mapping_error = None
+    with mapping_file, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # Submit each workspace as soon as its repository has been read
+        try:
+            for repo, directory_structure in iter_mapping(mapping_file):
+                results["total_repos"] += 1
+                print(f"\n{SEP}\nProcessing Repository: {repo}\n{SEP}")
+                
+                # Get all subdirectories for this repo
+                subdirectories = get_all_subdirectories(directory_structure)
+                
+                if not subdirectories:
+                    print(f"  No subdirectories found in {repo}")
+                    continue
+                
+                print(f"  Found {len(subdirectories)} subdirectories")
+                
+                # Per-repository part of each workspace's description
+                desc_prefix = f"Workflow for {repo}"
+                
+                for work_dir in subdirectories:
+                    # Format work directory with leading slash
+                    formatted_work_dir = format_work_dir(work_dir)
+                    
+                    key = (repo, formatted_work_dir)
+                    if key in planned:
+                        print(f"  Skipping duplicate work directory: {formatted_work_dir}")
+                        results["total_duplicates_skipped"] += 1
+                        continue
+                    planned.add(key)
+                    
+                    # Generate workspace name: owner/repo/subdir
+                    workspace_name = generate_workspace_name(repo, work_dir)
+                    description = desc_prefix + formatted_work_dir
+                    job = (repo, formatted_work_dir, workspace_name, description)
+                    jobs.append(job)
+                    futures.append(executor.submit(create_job, job))
+        except MAPPING_ERRORS as e:
+            # Still record the workspaces already submitted before the bad input
+            mapping_error = e
+            print(f"ERROR: Invalid JSON in '{MAPPING_JSON_FILE}': {e}")
+        
+        # On an interactive terminal with tqdm installed, a progress bar replaces
+        # the per-workspace report and only failures are printed; every result
+        # is still written to the results file
+        pbar = None
+        if tqdm is not None and sys.stderr.isatty():
+            pbar = tqdm(total=len(jobs), desc="Creating workspaces", unit="workspace")
+        
+        # Results are collected in submission order, so the output log keeps
+        # the mapping file's order; counters are only updated in this thread
+        for job, future in zip(jobs, futures):
+            result = future.result()
+            repo, formatted_work_dir, workspace_name, description = job
+            
+            # Each workspace's report goes out in a single write
+            lines = [
+                f"\n  Workspace: {workspace_name}",
+                f"    Repository: {repo}",
+                f"    Work Directory: {formatted_work_dir}"
+            ]
             
             workflow_info = {
                 "repo": repo,
@@ -356,38 +710,52 @@ def main():
             }
             
             if result["success"]:
-                print(f"    ✓ Successfully created workspace")
+                lines.append("    ✓ Successfully created workspace")
                 workflow_info["workspace_id"] = result["data"].get("id")
                 workflow_info["status_code"] = result["status_code"]
                 results["total_workflows_created"] += 1
             else:
-                print(f"    ✗ Failed to create workspace")
-                print(f"      Error: {result.get('error', 'Unknown error')}")
+                lines.append("    ✗ Failed to create workspace")
+                lines.append(f"      Error: {result.get('error', 'Unknown error')}")
                 if result.get("status_code"):
-                    print(f"      Status Code: {result['status_code']}")
+                    lines.append(f"      Status Code: {result['status_code']}")
                 if result.get("response_text"):
-                    print(f"      Response: {result['response_text'][:200]}")
+                    lines.append(f"      Response: {result['response_text'][:200]}")
                 workflow_info["error"] = result.get("error")
                 workflow_info["status_code"] = result.get("status_code")
                 results["total_workflows_failed"] += 1
             
-            results["workflows"].append(workflow_info)
-    
-    # Save results to file
-    try:
-        with open(OUTPUT_LOG_FILE, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
-        print(f"\n{'='*70}")
-        print("Summary")
-        print(f"{'='*70}")
-        print(f"Total repositories processed: {results['total_repos']}")
-        print(f"Total workflows created: {results['total_workflows_created']}")
-        print(f"Total workflows failed: {results['total_workflows_failed']}")
+            if pbar is None:
+                print("\n".join(lines))
+            else:
+                if not result["success"]:
+                    pbar.write("\n".join(lines))
+                pbar.update(1)
+                pbar.set_postfix(ok=results["total_workflows_created"],
+                                 fail=results["total_workflows_failed"], refresh=False)
+            
+            if log_file is not None:
+                log_file.write(_json_line(workflow_info))
+                log_file.flush()
+        
+        if pbar is not None:
+            pbar.close()
+    
+    # Finish the results file with a summary record
+    if log_file is not None:
+        with log_file:
+            log_file.write(_json_line({"_summary": results}))
+    
+    print(f"\n{SEP}\nSummary\n{SEP}")
+    print(f"Total repositories processed: {results['total_repos']}")
+    print(f"Total workflows created: {results['total_workflows_created']}")
+    print(f"Total workflows failed: {results['total_workflows_failed']}")
+    if results["total_duplicates_skipped"]:
+        print(f"Total duplicates skipped: {results['total_duplicates_skipped']}")
+    if log_file is not None:
         print(f"\nResults saved to: {OUTPUT_LOG_FILE}")
-    except Exception as e:
-        print(f"\nWarning: Could not save results to file: {e}")
     
-    return 0 if results["total_workflows_failed"] == 0 else 1
+    return 0 if results["total_workflows_failed"] == 0 and mapping_error is None else 1
 
 
 if __name__ == '__main__':